@@ -71,13 +71,36 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ]
 }
 
+# Cache de autenticação por token (segundos e quantidade máxima por processo)
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=60, cast=int)
+AUTH_TOKEN_CACHE_MAX = config('AUTH_TOKEN_CACHE_MAX', default=1024, cast=int)
+
+# Cache da aplicação (memória local por padrão; em produção com vários
+# processos, aponte para um backend compartilhado como Redis)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='toy-rental'),
+    }
+}
+
+# Dashboard em cache por organização (segundos; 0 desliga) e, se ativo,
+# devolve a versão anterior enquanto recalcula em segundo plano
+DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=300, cast=int)
+DASHBOARD_CACHE_STALE_WHILE_REVALIDATE = config(
+    'DASHBOARD_CACHE_STALE_WHILE_REVALIDATE', default=False, cast=bool)
+
+# Threads (cada uma com sua conexão) para calcular as seções do dashboard
+# em paralelo; 1 calcula em sequência
+DASHBOARD_WORKERS = config('DASHBOARD_WORKERS', default=4, cast=int)
+
 # Middlewares que processam as requisições/respostas
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
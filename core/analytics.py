@@ -0,0 +1,146 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from django.db.models import Min, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Brinquedo, Locacao, Transacoes
+
+
+def carregar_series(org):
+    """
+    Busca em lote (quatro consultas, independente da quantidade de
+    brinquedos) os dados de ROI da organização:
+
+    - brinquedos: DataFrame indexado por id com nome, status, valor_compra
+      e primeira_locacao (data da primeira festa);
+    - receita_mensal / manutencao_mensal: DataFrames brinquedo x mês
+      (pd.Period) com a receita paga das locações e a manutenção paga.
+    """
+    brinquedos = pd.DataFrame.from_records(
+        Brinquedo.objects.filter(organization=org).values_list(
+            'id', 'nome', 'status', 'valor_compra'),
+        columns=['id', 'nome', 'status', 'valor_compra'], index='id')
+    brinquedos['valor_compra'] = brinquedos['valor_compra'].fillna(0).astype(float)
+
+    primeiras = dict(Locacao.brinquedos.through.objects.filter(
+        brinquedo__organization=org
+    ).order_by().values_list('brinquedo_id').annotate(
+        primeira=Min('locacao__data_festa')))
+    brinquedos['primeira_locacao'] = brinquedos.index.map(primeiras)
+
+    receitas = Locacao.brinquedos.through.objects.filter(
+        locacao__organization=org,
+        locacao__transacoes__tipo='entrada',
+        locacao__transacoes__pagamento__in=['pago', 'entrada'],
+    ).order_by().values_list(
+        'brinquedo_id', TruncMonth('locacao__transacoes__data_transacao')
+    ).annotate(total=Sum('locacao__transacoes__valor'))
+
+    manutencoes = Transacoes.objects.filter(
+        brinquedo__organization=org, tipo='saida', categoria='manutencao', pagamento='pago'
+    ).order_by().values_list(
+        'brinquedo_id', TruncMonth('data_transacao')
+    ).annotate(total=Sum('valor'))
+
+    return {
+        'brinquedos': brinquedos,
+        'receita_mensal': _pivotar(receitas),
+        'manutencao_mensal': _pivotar(manutencoes),
+    }
+
+
+def _pivotar(linhas):
+    """[(brinquedo_id, mês, total), ...] → DataFrame brinquedo x mês."""
+    serie = pd.DataFrame.from_records(
+        linhas, columns=['brinquedo', 'mes', 'total'])
+    serie['mes'] = pd.PeriodIndex(pd.to_datetime(serie['mes']), freq='M')
+    serie['total'] = serie['total'].astype(float)
+    return serie.pivot_table(
+        index='brinquedo', columns='mes', values='total', aggfunc='sum', fill_value=0.0)
+
+
+def calcular_indicadores(brinquedos, receita_mensal, manutencao_mensal, hoje=None, janela=6):
+    """
+    Indicadores de ROI e payback de todos os brinquedos de uma vez, com
+    operações vetorizadas sobre a matriz brinquedo x mês. Retorna um
+    DataFrame indexado como `brinquedos` com:
+
+    receita_acumulada, manutencao_acumulada, custo_total, roi_percentual,
+    receita_mensal_media (desde a primeira locação), receita_mensal_recente
+    (média dos últimos `janela` meses), meses_para_payback (NaN se já pago
+    ou sem receita), mes_payback (mês em que se pagou ou, se ainda não, o
+    previsto pelo ritmo recente; None se não há previsão).
+    """
+    hoje = hoje or date.today()
+    mes_atual = pd.Period(hoje, freq='M')
+    extremos = [mes_atual]
+    for serie in (receita_mensal, manutencao_mensal):
+        if len(serie.columns):
+            extremos += [serie.columns.min(), serie.columns.max()]
+    meses = pd.period_range(min(extremos), max(extremos), freq='M')
+    atual = meses.get_loc(mes_atual)
+
+    # Matrizes alinhadas (brinquedo x mês)
+    receita = receita_mensal.reindex(
+        index=brinquedos.index, columns=meses, fill_value=0.0).to_numpy()
+    manutencao = manutencao_mensal.reindex(
+        index=brinquedos.index, columns=meses, fill_value=0.0).to_numpy()
+    valor_compra = brinquedos['valor_compra'].to_numpy(dtype=float)
+
+    receita_acumulada = receita.sum(axis=1)
+    manutencao_acumulada = manutencao.sum(axis=1)
+    custo_total = valor_compra + manutencao_acumulada
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roi = np.where(custo_total > 0,
+                       (receita_acumulada - custo_total) / custo_total * 100, 0.0)
+
+        # Meses de operação contados a partir da primeira locação
+        primeira = pd.to_datetime(brinquedos['primeira_locacao'])
+        meses_operacao = ((hoje.year - primeira.dt.year) * 12 +
+                          hoje.month - primeira.dt.month + 1).to_numpy(dtype=float)
+        media = np.where(meses_operacao > 0,
+                         receita_acumulada / meses_operacao, 0.0)
+        media = np.nan_to_num(media)
+
+        recente = receita[:, max(atual - janela + 1, 0):atual + 1].sum(axis=1) / janela
+        faltante = custo_total - receita_acumulada
+        meses_para_payback = np.where(
+            (faltante > 0) & (media > 0), faltante / media, np.nan)
+
+    # Mês em que o saldo acumulado (receita - compra - manutenção) ficou >= 0
+    saldo = np.cumsum(receita - manutencao, axis=1) - valor_compra[:, None]
+    pago = saldo >= 0
+    ja_pago = pago.any(axis=1) & (faltante <= 0) & (custo_total > 0)
+    indice_pago = pago.argmax(axis=1)
+
+    # Ainda não pago: projeção pelo ritmo recente
+    with np.errstate(divide='ignore', invalid='ignore'):
+        meses_ate_pagar = np.ceil(np.where(
+            (faltante > 0) & (recente > 0), faltante / recente, np.nan))
+
+    mes_payback = [
+        str(meses[i]) if foi_pago else (
+            str(mes_atual + int(restante)) if not np.isnan(restante) else None)
+        for foi_pago, i, restante in zip(ja_pago, indice_pago, meses_ate_pagar)
+    ]
+
+    return pd.DataFrame({
+        'nome': brinquedos['nome'],
+        'status': brinquedos['status'],
+        'valor_compra': valor_compra,
+        'receita_acumulada': receita_acumulada,
+        'manutencao_acumulada': manutencao_acumulada,
+        'custo_total': custo_total,
+        'roi_percentual': roi,
+        'receita_mensal_media': media,
+        'receita_mensal_recente': recente,
+        'meses_para_payback': meses_para_payback,
+        'mes_payback': mes_payback,
+    }, index=brinquedos.index)
+
+
+def indicadores_por_brinquedo(org, hoje=None, janela=6):
+    return calcular_indicadores(**carregar_series(org), hoje=hoje, janela=janela)
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class CacheTokens:
+    """
+    Cache em memória (por processo) de token → Token com user, profile e
+    organization já carregados. Limitado por TTL e por tamanho (LRU).
+    """
+
+    def __init__(self):
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60)
+
+    @property
+    def tamanho_maximo(self):
+        return getattr(settings, 'AUTH_TOKEN_CACHE_MAX', 1024)
+
+    def obter(self, key):
+        with self._lock:
+            item = self._itens.get(key)
+            if item is None:
+                return None
+            token, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[key]
+                return None
+            self._itens.move_to_end(key)
+            return token
+
+    def guardar(self, token):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._itens[token.key] = (token, time.monotonic() + self.ttl)
+            self._itens.move_to_end(token.key)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def invalidar_token(self, key):
+        with self._lock:
+            self._itens.pop(key, None)
+
+    def invalidar_usuario(self, user_id):
+        self._invalidar_onde(lambda token: token.user_id == user_id)
+
+    def invalidar_organizacao(self, organization_id):
+        def da_organizacao(token):
+            profile = getattr(token.user, 'profile', None)
+            return profile is not None and profile.organization_id == organization_id
+        self._invalidar_onde(da_organizacao)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def _invalidar_onde(self, condicao):
+        with self._lock:
+            for key in [k for k, (token, _expira) in self._itens.items() if condicao(token)]:
+                del self._itens[key]
+
+
+cache_tokens = CacheTokens()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication que carrega user → profile → organization em uma
+    única query com joins e guarda o resultado em cache_tokens. Requisições
+    seguintes com o mesmo token não consultam o banco para autenticar.
+    """
+
+    def authenticate_credentials(self, key):
+        token = cache_tokens.obter(key)
+        if token is None:
+            try:
+                token = Token.objects.select_related(
+                    'user__profile__organization').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(
+                    _('User inactive or deleted.'))
+
+            cache_tokens.guardar(token)
+
+        return (token.user, token)
@@ -0,0 +1,160 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import accumulate, groupby
+
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import Brinquedo, Locacao, OcupacaoDiaria
+
+
+def unidades_do_brinquedo(qtd_total):
+    """Brinquedos antigos sem quantidade cadastrada contam como uma unidade."""
+    return max(qtd_total or 0, 1)
+
+
+def intervalos_reservados(organization, inicio, fim, excluir_locacao=None, brinquedos=None):
+    """
+    Uma única consulta agregada na tabela M2M locação ↔ brinquedo: para
+    cada brinquedo, os intervalos (data_festa, data_desmontagem) que tocam
+    [inicio, fim] e quantas locações reservam cada intervalo.
+    """
+    reservas = Locacao.brinquedos.through.objects.filter(
+        locacao__organization=organization,
+        locacao__data_festa__lte=fim,
+        locacao__data_desmontagem__gte=inicio,
+    )
+    if excluir_locacao is not None:
+        reservas = reservas.exclude(locacao_id=excluir_locacao)
+    if brinquedos is not None:
+        reservas = reservas.filter(brinquedo_id__in=brinquedos)
+
+    intervalos = defaultdict(list)
+    for brinquedo_id, data_festa, data_desmontagem, qtd in reservas.order_by().values_list(
+        'brinquedo_id', 'locacao__data_festa', 'locacao__data_desmontagem'
+    ).annotate(qtd=Count('locacao_id')):
+        intervalos[brinquedo_id].append((data_festa, data_desmontagem, qtd))
+    return intervalos
+
+
+def pico_de_reservas(intervalos):
+    """
+    Maior número de unidades reservadas ao mesmo tempo (varredura pelos
+    inícios e fins dos intervalos; o fim é inclusivo).
+    """
+    eventos = []
+    for data_festa, data_desmontagem, qtd in intervalos:
+        eventos.append((data_festa, qtd))
+        eventos.append((data_desmontagem + timedelta(days=1), -qtd))
+    # No mesmo dia, saídas (-) antes das entradas (+)
+    eventos.sort()
+
+    atual = pico = 0
+    for _dia, delta in eventos:
+        atual += delta
+        pico = max(pico, atual)
+    return pico
+
+
+def disponibilidade(organization, inicio, fim, excluir_locacao=None, brinquedos=None):
+    """
+    Quantidade livre de cada brinquedo da organização no período
+    [inicio, fim]: {brinquedo_id: unidades livres}.
+
+    Lê o pico de cada brinquedo na tabela OcupacaoDiaria. Ao editar uma
+    locação (excluir_locacao), ela não pode contar contra si mesma, então o
+    cálculo é feito a partir dos intervalos das locações.
+    """
+    totais = Brinquedo.objects.filter(organization=organization)
+    if brinquedos is not None:
+        totais = totais.filter(id__in=brinquedos)
+
+    if excluir_locacao is None:
+        ocupacao = OcupacaoDiaria.objects.filter(
+            organization=organization, dia__range=(inicio, fim))
+        if brinquedos is not None:
+            ocupacao = ocupacao.filter(brinquedo_id__in=brinquedos)
+        picos = dict(ocupacao.order_by().values_list(
+            'brinquedo_id').annotate(pico=Max('reservados')))
+    else:
+        picos = {
+            brinquedo_id: pico_de_reservas(intervalos)
+            for brinquedo_id, intervalos in intervalos_reservados(
+                organization, inicio, fim, excluir_locacao, brinquedos).items()
+        }
+
+    return {
+        brinquedo_id: max(
+            unidades_do_brinquedo(qtd_total) - picos.get(brinquedo_id, 0), 0)
+        for brinquedo_id, qtd_total in totais.values_list('id', 'qtd_total')
+    }
+
+
+def calcular_ocupacao(organization, inicio, fim, brinquedos=None):
+    """
+    Unidades reservadas de cada brinquedo em cada dia de [inicio, fim],
+    calculadas a partir das locações: {brinquedo_id: [dia 0, dia 1, ...]}.
+    Monta os vetores com um array de diferenças sobre os intervalos.
+    """
+    dias = (fim - inicio).days + 1
+    ocupacao = {}
+    for brinquedo_id, intervalos in intervalos_reservados(
+            organization, inicio, fim, brinquedos=brinquedos).items():
+        diferencas = [0] * (dias + 1)
+        for data_festa, data_desmontagem, qtd in intervalos:
+            if data_desmontagem < data_festa:
+                continue
+            diferencas[max((data_festa - inicio).days, 0)] += qtd
+            diferencas[min((data_desmontagem - inicio).days, dias - 1) + 1] -= qtd
+        ocupacao[brinquedo_id] = list(accumulate(diferencas[:-1]))
+    return ocupacao
+
+
+def ocupacao_por_dia(organization, inicio, fim, brinquedos=None):
+    """
+    Mesmo formato de calcular_ocupacao(), lido da tabela OcupacaoDiaria
+    (varredura de índice na faixa de datas).
+    """
+    dias = (fim - inicio).days + 1
+    linhas = OcupacaoDiaria.objects.filter(
+        organization=organization, dia__range=(inicio, fim))
+    if brinquedos is not None:
+        linhas = linhas.filter(brinquedo_id__in=brinquedos)
+
+    ocupacao = {}
+    for brinquedo_id, dia, reservados in linhas.values_list('brinquedo_id', 'dia', 'reservados'):
+        if brinquedo_id not in ocupacao:
+            ocupacao[brinquedo_id] = [0] * dias
+        ocupacao[brinquedo_id][(dia - inicio).days] = reservados
+    return ocupacao
+
+
+def recalcular_ocupacao(organization_id, brinquedos, inicio, fim):
+    """
+    Reescreve as linhas de OcupacaoDiaria dos brinquedos no período a partir
+    das locações. Chamado pelos signals só para o trecho afetado.
+    """
+    brinquedos = list(brinquedos)
+    if not organization_id or not brinquedos or fim < inicio:
+        return
+
+    with transaction.atomic():
+        # Trava os brinquedos na mesma ordem de validar_disponibilidade():
+        # uma reserva concorrente espera, e a contagem inclui o que ela gravou
+        list(Brinquedo.objects.select_for_update().filter(
+            id__in=brinquedos).order_by('id').values_list('id', flat=True))
+
+        ocupacao = calcular_ocupacao(organization_id, inicio, fim, brinquedos)
+        OcupacaoDiaria.objects.filter(
+            brinquedo_id__in=brinquedos, dia__range=(inicio, fim)).delete()
+        OcupacaoDiaria.objects.bulk_create([
+            OcupacaoDiaria(organization_id=organization_id, brinquedo_id=brinquedo_id,
+                           dia=inicio + timedelta(days=i), reservados=reservados)
+            for brinquedo_id, por_dia in ocupacao.items()
+            for i, reservados in enumerate(por_dia) if reservados
+        ])
+
+
+def run_length(valores):
+    """[0, 0, 2, 2, 2, 0] → [[0, 2], [2, 3], [0, 1]] (valor, repetições)."""
+    return [[valor, len(list(grupo))] for valor, grupo in groupby(valores)]
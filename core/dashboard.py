@@ -0,0 +1,309 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, Count, DecimalField, F, Func, Q, Sum, When, Window
+from django.db.models.functions import Coalesce
+from dateutil.relativedelta import relativedelta
+
+from .analytics import indicadores_por_brinquedo
+from .models import Brinquedo, ResumoFinanceiroMensal, Transacoes
+
+
+class SomaAcumulada(Func):
+    """SUM(...) usado como window function sobre um agregado (SUM(SUM(x)) OVER ...)."""
+    function = 'SUM'
+    window_compatible = True
+
+
+def calcular_stat_cards(org, periodo):
+    # Totais de toda a história da organização (não usam o período)
+    investimento_total = Brinquedo.objects.filter(organization=org).aggregate(
+        total=Coalesce(Sum('valor_compra'), Decimal(
+            '0.00'), output_field=DecimalField())
+    )['total']
+
+    # Totais financeiros lidos do resumo mensal (ResumoFinanceiroMensal)
+    resumo = ResumoFinanceiroMensal.objects.filter(organization=org)
+
+    receita_acumulada = resumo.filter(
+        tipo='entrada', pagamento__in=['pago', 'entrada']
+    ).aggregate(
+        total=Coalesce(Sum('total'), Decimal('0.00'),
+                       output_field=DecimalField())
+    )['total']
+
+    despesa_total = resumo.filter(
+        tipo='saida', pagamento='pago'
+    ).aggregate(
+        total=Coalesce(Sum('total'), Decimal('0.00'),
+                       output_field=DecimalField())
+    )['total']
+
+    roi_global = Decimal('0.00')
+    if investimento_total > 0:
+        lucro = receita_acumulada - despesa_total
+        roi_global = (lucro / investimento_total) * 100
+
+    return {'stat_cards': {
+        'investimento_total': investimento_total,
+        'receita_acumulada': receita_acumulada,
+        'roi_global': roi_global,
+    }}
+
+
+def calcular_tabelas_brinquedos(org, periodo):
+    """ROI e previsão de break-even por brinquedo (toda a história)."""
+    indicadores = indicadores_por_brinquedo(org)
+    status_choices = dict(Brinquedo.STATUS_CHOICES)
+
+    roi_por_brinquedo = []
+    previsao_break_even = []
+    for linha in indicadores.round(2).reset_index().to_dict('records'):
+        roi_por_brinquedo.append({
+            'id': linha['id'], 'nome': linha['nome'], 'valor_compra': linha['valor_compra'],
+            'manutencao_acumulada': linha['manutencao_acumulada'], 'receita_acumulada': linha['receita_acumulada'],
+            'roi_percentual': linha['roi_percentual'], 'status': status_choices.get(linha['status'], linha['status']),
+        })
+
+        if linha['custo_total'] <= linha['receita_acumulada']:
+            previsao_payback_str = "Já pago"
+        elif linha['receita_mensal_media'] > 0:
+            previsao_payback_str = f"{linha['meses_para_payback']:.1f} meses"
+        else:
+            previsao_payback_str = "Nunca (sem receita)"
+
+        previsao_break_even.append({
+            'id': linha['id'], 'nome': linha['nome'], 'investimento_total': linha['custo_total'],
+            'receita_mensal_media': linha['receita_mensal_media'],
+            'receita_mensal_recente': linha['receita_mensal_recente'],
+            'receita_acumulada_atual': linha['receita_acumulada'],
+            'previsao_payback': previsao_payback_str,
+            'mes_payback': linha['mes_payback'],
+        })
+
+    return {
+        'tabela_roi_brinquedo': roi_por_brinquedo,
+        'tabela_break_even': previsao_break_even,
+    }
+
+
+def calcular_receita_despesa(org, periodo):
+    transacoes_por_mes = ResumoFinanceiroMensal.objects.filter(
+        organization=org, pagamento__in=['pago', 'entrada'])
+    if periodo:
+        transacoes_por_mes = transacoes_por_mes.filter(mes__range=periodo)
+    transacoes_por_mes = transacoes_por_mes.values('mes').annotate(
+        receita=Coalesce(Sum('total', filter=Q(
+            tipo='entrada')), Decimal('0.00')),
+        despesa=Coalesce(
+            Sum('total', filter=Q(tipo='saida')), Decimal('0.00'))
+    ).order_by('mes')
+    return {'chart_receita_despesa': [{'mes': i['mes'].strftime('%b/%Y'), 'Receita': float(
+        i['receita']), 'Despesa': float(i['despesa'])} for i in transacoes_por_mes]}
+
+
+def calcular_ranking_brinquedos(org, periodo):
+    alugueis = Count('locacao')
+    if periodo:
+        alugueis = Count('locacao', filter=Q(
+            locacao__data_festa__range=periodo))
+    ranking_brinquedos = Brinquedo.objects.filter(organization=org).annotate(
+        total_alugueis=alugueis).filter(total_alugueis__gt=0).order_by('-total_alugueis')[:5]
+    return {'chart_ranking_brinquedos': [
+        {'nome': b.nome, 'Aluguéis': b.total_alugueis} for b in ranking_brinquedos]}
+
+
+def calcular_despesas_categoria(org, periodo):
+    despesas_por_categoria = ResumoFinanceiroMensal.objects.filter(
+        organization=org, tipo='saida', pagamento='pago')
+    if periodo:
+        despesas_por_categoria = despesas_por_categoria.filter(
+            mes__range=periodo)
+    despesas_por_categoria = despesas_por_categoria.values(
+        'categoria').annotate(soma=Sum('total')).order_by('-soma')
+    categoria_choices = dict(Transacoes.CATEGORIA_CHOICES)
+    return {'chart_despesas_categoria': [{'name': categoria_choices.get(
+        i['categoria'], i['categoria']), 'value': float(i['soma'])} for i in despesas_por_categoria]}
+
+
+def calcular_saldo_acumulado(org, periodo):
+    # Saldo de cada mês somado no banco e acumulado com uma window function
+    # (uma linha por mês). Com período, o acumulado ainda parte do início
+    # da história: só os meses anteriores são descartados do resultado.
+    movimento = Case(When(tipo='entrada', then=F('total')),
+                     default=-F('total'), output_field=DecimalField())
+    saldo_por_mes = ResumoFinanceiroMensal.objects.filter(
+        organization=org, pagamento__in=['pago', 'entrada'])
+    if periodo:
+        saldo_por_mes = saldo_por_mes.filter(mes__lte=periodo[1])
+    saldo_por_mes = saldo_por_mes.values('mes').annotate(
+        movimento=Sum(movimento)
+    ).annotate(
+        saldo=Window(SomaAcumulada('movimento'), order_by=F('mes').asc())
+    ).values_list('mes', 'saldo').order_by('mes')
+    return {'chart_saldo_acumulado': [
+        {'mes': mes.strftime('%b/%Y'), 'Saldo': float(saldo)}
+        for mes, saldo in saldo_por_mes if not periodo or mes >= periodo[0]]}
+
+
+def calcular_receita_brinquedo(org, periodo):
+    filtro = Q(locacao__transacoes__tipo='entrada',
+               locacao__transacoes__pagamento__in=['pago', 'entrada'])
+    if periodo:
+        filtro &= Q(locacao__transacoes__data_transacao__range=periodo)
+    receita_por_brinquedo_query = Brinquedo.objects.filter(organization=org).annotate(
+        total_receita=Coalesce(
+            Sum('locacao__transacoes__valor', filter=filtro), Decimal('0.00'))
+    ).filter(total_receita__gt=0).order_by('-total_receita')[:10]
+    return {'chart_receita_brinquedo': [{'nome': b.nome, 'Receita': float(
+        b.total_receita)} for b in receita_por_brinquedo_query]}
+
+
+# Seções da resposta, na ordem em que aparecem, e a função que calcula cada
+# uma (as duas tabelas por brinquedo saem do mesmo cálculo)
+SECOES = {
+    'stat_cards': calcular_stat_cards,
+    'tabela_roi_brinquedo': calcular_tabelas_brinquedos,
+    'tabela_break_even': calcular_tabelas_brinquedos,
+    'chart_receita_despesa': calcular_receita_despesa,
+    'chart_ranking_brinquedos': calcular_ranking_brinquedos,
+    'chart_despesas_categoria': calcular_despesas_categoria,
+    'chart_saldo_acumulado': calcular_saldo_acumulado,
+    'chart_receita_brinquedo': calcular_receita_brinquedo,
+}
+
+
+def periodo_em_meses(inicio, fim):
+    """Alinha [inicio, fim] a meses inteiros: (1º dia do mês, último dia do mês)."""
+    return (date(inicio.year, inicio.month, 1),
+            date(fim.year, fim.month, 1) + relativedelta(months=1, days=-1))
+
+
+def calcular_dashboard(org, secoes=None, periodo=None):
+    """
+    Calcula as seções pedidas do dashboard (todas, se None). Seções não
+    pedidas não geram nenhuma consulta. `periodo` = (inicio, fim) alinhado
+    a meses restringe os gráficos; stat cards e tabelas são sempre do
+    histórico inteiro.
+    """
+    secoes = list(SECOES) if secoes is None else secoes
+    calculos = list(dict.fromkeys(SECOES[secao] for secao in secoes))
+
+    resultados = {}
+    # Dentro de uma transação as outras conexões não enxergariam os dados
+    # ainda não confirmados: aí o cálculo é sequencial
+    if settings.DASHBOARD_WORKERS > 1 and len(calculos) > 1 and not connection.in_atomic_block:
+        for parcial in _executor().map(lambda calcular: _calcular_em_thread(calcular, org, periodo), calculos):
+            resultados.update(parcial)
+    else:
+        for calcular in calculos:
+            resultados.update(calcular(org, periodo))
+    return {secao: resultados[secao] for secao in SECOES if secao in secoes}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    """Pool de threads compartilhado; cada thread usa a própria conexão."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+        return _pool
+
+
+def _calcular_em_thread(calcular, org, periodo):
+    # As threads do pool não passam pelo ciclo de requisição do Django:
+    # aplica aqui o mesmo descarte de conexões (CONN_MAX_AGE, health check,
+    # conexão com erro) antes e depois de cada tarefa
+    close_old_connections()
+    try:
+        return calcular(org, periodo)
+    finally:
+        close_old_connections()
+
+
+# Cache do dashboard por organização. Cada organização tem uma "geração"
+# no cache, trocada pelos signals quando transações, locações ou brinquedos
+# mudam; uma entrada só vale se foi calculada na geração atual. Com mais de
+# um processo, use um backend compartilhado (Redis, Memcached) em CACHES.
+def _chave(organization_id, secoes, periodo):
+    # Uma entrada por combinação de seções e período pedida
+    inicio, fim = periodo or ('', '')
+    return f"dashboard:{organization_id}:{','.join(secoes)}:{inicio}:{fim}"
+
+
+def _chave_geracao(organization_id):
+    return f'dashboard:{organization_id}:geracao'
+
+
+def invalidar_dashboard(organization_id):
+    """Descarta o dashboard em cache quando a transação atual for confirmada."""
+    if not organization_id:
+        return
+    transaction.on_commit(lambda: cache.set(
+        _chave_geracao(organization_id), uuid.uuid4().hex, None))
+
+
+def _geracao_atual(organization_id):
+    geracao = cache.get(_chave_geracao(organization_id))
+    if geracao is None:
+        cache.add(_chave_geracao(organization_id), uuid.uuid4().hex, None)
+        geracao = cache.get(_chave_geracao(organization_id))
+    return geracao
+
+
+def _calcular_e_guardar(org, secoes, periodo, geracao):
+    dados = calcular_dashboard(org, secoes, periodo)
+    cache.set(_chave(org.id, secoes, periodo), {'geracao': geracao, 'dados': dados},
+              settings.DASHBOARD_CACHE_TTL)
+    return dados
+
+
+def _recalcular_em_segundo_plano(org, secoes, periodo, geracao):
+    # Só uma thread por entrada recalcula por vez
+    chave_trava = f'{_chave(org.id, secoes, periodo)}:recalculando'
+    if not cache.add(chave_trava, True, 60):
+        return
+
+    def recalcular():
+        try:
+            _calcular_e_guardar(org, secoes, periodo, geracao)
+        finally:
+            cache.delete(chave_trava)
+            connection.close()
+
+    threading.Thread(target=recalcular, daemon=True).start()
+
+
+def dashboard_em_cache(org, secoes=None, periodo=None):
+    """
+    calcular_dashboard() da organização, do cache quando ainda válido. Com
+    DASHBOARD_CACHE_STALE_WHILE_REVALIDATE, uma entrada desatualizada é
+    devolvida na hora e recalculada em segundo plano.
+    """
+    secoes = [secao for secao in SECOES if secoes is None or secao in secoes]
+    if settings.DASHBOARD_CACHE_TTL <= 0:
+        return calcular_dashboard(org, secoes, periodo)
+
+    # A geração é lida antes do cálculo: uma alteração feita durante o
+    # cálculo deixa a entrada gravada já desatualizada
+    geracao = _geracao_atual(org.id)
+    entrada = cache.get(_chave(org.id, secoes, periodo))
+    if entrada is not None:
+        if entrada['geracao'] == geracao:
+            return entrada['dados']
+        if settings.DASHBOARD_CACHE_STALE_WHILE_REVALIDATE:
+            _recalcular_em_segundo_plano(org, secoes, periodo, geracao)
+            return entrada['dados']
+
+    return _calcular_e_guardar(org, secoes, periodo, geracao)
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, When
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import Organization, ResumoFinanceiroMensal, SaldoMensal, Transacoes
+
+# Situações de pagamento que entram no saldo (as mesmas do dashboard)
+PAGAMENTOS_DO_SALDO = ['pago', 'entrada']
+
+
+def inicio_do_mes(dia):
+    return date(dia.year, dia.month, 1)
+
+
+def agregar_transacoes(transacoes):
+    """
+    Agrupa um queryset de Transacoes por organização, mês, tipo, categoria e
+    pagamento: uma linha de ResumoFinanceiroMensal (não salva) por grupo.
+    """
+    linhas = transacoes.order_by().annotate(mes=TruncMonth('data_transacao')).values(
+        'organization_id', 'mes', 'tipo', 'categoria', 'pagamento'
+    ).annotate(total=Sum('valor'), quantidade=Count('id'))
+    return [ResumoFinanceiroMensal(**linha) for linha in linhas]
+
+
+def recalcular_resumo(meses):
+    """
+    Reescreve as linhas do resumo para os pares (organization_id, mês)
+    recebidos, a partir das transações daqueles meses. Chamado pelos
+    signals só para os meses tocados pela alteração.
+
+    Cada organização é reescrita numa única transação, com a linha da
+    organização travada do começo ao fim: duas escritas simultâneas no
+    mesmo mês não se atropelam, ninguém vê o mês vazio entre o DELETE e o
+    INSERT e nenhum fechamento (SaldoMensal) é montado no meio da troca.
+    """
+    por_organizacao = defaultdict(set)
+    for organization_id, dia in meses:
+        if organization_id and dia:
+            por_organizacao[organization_id].add(inicio_do_mes(dia))
+
+    for organization_id, inicios in sorted(por_organizacao.items()):
+        periodos = Q()
+        for inicio in inicios:
+            periodos |= Q(data_transacao__gte=inicio,
+                          data_transacao__lt=inicio + relativedelta(months=1))
+
+        with transaction.atomic():
+            _travar_organizacao(organization_id)
+            invalidar_saldos(organization_id, min(inicios))
+            ResumoFinanceiroMensal.objects.filter(
+                organization_id=organization_id, mes__in=inicios).delete()
+            ResumoFinanceiroMensal.objects.bulk_create(agregar_transacoes(
+                Transacoes.objects.filter(periodos, organization_id=organization_id)))
+
+
+def _movimento(campo):
+    """Valor com sinal: entradas somam, saídas subtraem."""
+    return Case(When(tipo='entrada', then=F(campo)),
+                default=-F(campo), output_field=DecimalField())
+
+
+def _travar_organizacao(organization_id):
+    # Serializa a criação dos fechamentos com a reescrita do resumo da
+    # organização: o lock vale até o fim da transação de quem o pegou
+    # (NO KEY UPDATE não bloqueia inserts que só referenciam a organização)
+    list(Organization.objects.select_for_update(no_key=True).filter(
+        pk=organization_id).values_list('pk', flat=True))
+
+
+def invalidar_saldos(organization_id, mes):
+    """
+    Apaga os fechamentos a partir de `mes` (transações do mês mudaram).
+    Deve rodar na mesma transação que reescreve o resumo, com a organização
+    já travada (ver recalcular_resumo).
+    """
+    SaldoMensal.objects.filter(
+        organization_id=organization_id, mes__gte=inicio_do_mes(mes)).delete()
+
+
+def saldo_no_fechamento(organization_id, mes):
+    """
+    Saldo ao fim do mês `mes`. Lê o fechamento salvo; se faltar, cria os
+    fechamentos que faltam a partir do último existente somando o
+    ResumoFinanceiroMensal (uma linha por mês e categoria).
+    """
+    mes = inicio_do_mes(mes)
+    anterior = SaldoMensal.objects.filter(
+        organization_id=organization_id, mes__lte=mes).order_by('-mes').first()
+    if anterior is not None and anterior.mes == mes:
+        return anterior.saldo
+
+    with transaction.atomic():
+        _travar_organizacao(organization_id)
+        anterior = SaldoMensal.objects.filter(
+            organization_id=organization_id, mes__lte=mes).order_by('-mes').first()
+        if anterior is not None and anterior.mes == mes:
+            return anterior.saldo
+
+        movimentos = ResumoFinanceiroMensal.objects.filter(
+            organization_id=organization_id, pagamento__in=PAGAMENTOS_DO_SALDO, mes__lte=mes)
+        if anterior is not None:
+            movimentos = movimentos.filter(mes__gt=anterior.mes)
+        movimentos = dict(movimentos.order_by().values_list('mes').annotate(
+            movimento=Sum(_movimento('total'))))
+
+        if anterior is not None:
+            saldo, atual = anterior.saldo, anterior.mes + relativedelta(months=1)
+        elif movimentos:
+            saldo, atual = Decimal('0.00'), min(movimentos)
+        else:
+            return Decimal('0.00')  # Nenhuma transação até o mês
+
+        fechamentos = []
+        while atual <= mes:
+            saldo += movimentos.get(atual, Decimal('0.00'))
+            fechamentos.append(SaldoMensal(
+                organization_id=organization_id, mes=atual, saldo=saldo))
+            atual += relativedelta(months=1)
+        SaldoMensal.objects.bulk_create(fechamentos)
+        return saldo
+
+
+def saldo_ate(organization, data):
+    """
+    Saldo da organização até `data` (inclusive): fechamento do mês anterior
+    + transações do próprio mês (no máximo um mês de linhas).
+    """
+    organization_id = getattr(organization, 'pk', organization)
+    inicio = inicio_do_mes(data)
+    saldo_anterior = saldo_no_fechamento(
+        organization_id, inicio - relativedelta(months=1))
+    movimento_do_mes = Transacoes.objects.filter(
+        organization_id=organization_id, pagamento__in=PAGAMENTOS_DO_SALDO,
+        data_transacao__gte=inicio, data_transacao__lte=data,
+    ).aggregate(total=Coalesce(Sum(_movimento('valor')), Decimal('0.00')))['total']
+    return saldo_anterior + movimento_do_mes
@@ -0,0 +1,441 @@
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory
+
+from core.authentication import cache_tokens
+from core.models import Brinquedo, Cliente, Locacao, Organization, Profile, ResumoFinanceiroMensal, Transacoes
+from core.serializers import LocacaoSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Micro-benchmarks de latência e número de queries dos caminhos críticos. '
+        'Os dados criados são descartados (rollback) ao final.'
+    )
+
+    cenarios = ['login', 'reservas', 'dashboard', 'roi', 'parcelas', 'locacoes']
+    # Cenários com várias threads (ou que dependem do on_commit) precisam de
+    # dados commitados (e limpam no fim)
+    cenarios_concorrentes = ['reservas', 'dashboard', 'locacoes']
+
+    # Máximo de queries por gravação no cenário "locacoes" (falha se passar)
+    orcamento_locacoes = {'criar': 60, 'editar': 45}
+
+    def add_arguments(self, parser):
+        parser.add_argument('cenario', choices=self.cenarios)
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--brinquedos', type=int, default=150,
+                            help='Quantidade de brinquedos nos cenários "dashboard" e "roi"')
+        parser.add_argument('--meses', type=int, default=60,
+                            help='Meses de histórico no cenário "roi"')
+
+    def handle(self, *args, **options):
+        self.repeticoes = options['repeticoes']
+        self.threads = options['threads']
+        self.brinquedos = options['brinquedos']
+        self.meses = options['meses']
+        self.factory = APIRequestFactory()
+        benchmark = getattr(self, f"benchmark_{options['cenario']}")
+        if options['cenario'] in self.cenarios_concorrentes:
+            benchmark()
+            return
+        with transaction.atomic():
+            benchmark()
+            transaction.set_rollback(True)
+
+    def medir(self, nome, funcao):
+        """
+        Executa `funcao` N vezes e imprime latência (ms) e queries por
+        chamada. Retorna o maior número de queries de uma chamada.
+        """
+        tempos, queries = [], []
+        for _ in range(self.repeticoes):
+            with CaptureQueriesContext(connection) as contexto:
+                inicio = time.perf_counter()
+                funcao()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            queries.append(len(contexto))
+
+        tempos.sort()
+        p95 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+        # A primeira chamada pode custar mais (ex.: criação do token)
+        total_queries = str(min(queries)) if min(queries) == max(
+            queries) else f'{min(queries)}-{max(queries)}'
+        self.stdout.write(
+            f'{nome:<40} média {statistics.mean(tempos):8.2f} ms   '
+            f'p95 {p95:8.2f} ms   queries {total_queries}'
+        )
+        return max(queries)
+
+    def criar_organizacao(self, username='benchmark'):
+        user = User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='benchmark-senha')
+        org = Organization.objects.create(name=f'Org {username}', owner=user)
+        Profile.objects.update_or_create(
+            user=user, defaults={'organization': org, 'role': 'admin'})
+        return user, org
+
+    def benchmark_login(self):
+        from core.views import LoginCreateAPIView
+
+        self.criar_organizacao()
+        dados = {'email': 'Benchmark@Example.com',
+                 'password': 'benchmark-senha'}
+
+        def login():
+            resposta = LoginCreateAPIView(
+                self.factory.post('/api/login/', dados, format='json'))
+            assert resposta.status_code == 200, resposta.data
+
+        def login_invalido():
+            resposta = LoginCreateAPIView(self.factory.post(
+                '/api/login/', {**dados, 'password': 'errada'}, format='json'))
+            assert resposta.status_code == 401
+
+        self.medir('login', login)
+        self.medir('login (senha inválida)', login_invalido)
+        cache_tokens.limpar()
+
+    def benchmark_reservas(self):
+        """
+        Várias threads (cada uma com sua conexão) reservando ao mesmo tempo:
+        metade disputa as 2 unidades de um mesmo brinquedo na mesma data, a
+        outra metade reserva brinquedos próprios. Confere que não houve
+        overbooking e mede a vazão.
+        """
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'O cenário "reservas" precisa de PostgreSQL (SELECT ... FOR UPDATE).')
+
+        user, org = self.criar_organizacao('benchmark-reservas')
+        cliente = Cliente.objects.create(
+            organization=org, nome='Cliente Benchmark', documento='000', telefone='000',
+            cep='00000-000', endereco='Rua', cidade='Cidade', uf='SP')
+        disputado = Brinquedo.objects.create(
+            organization=org, nome='Disputado', valor_diaria=100, qtd_total=2,
+            qtd_disponivel=2, tamanho='3x3')
+        proprios = [Brinquedo.objects.create(
+            organization=org, nome=f'Próprio {i}', valor_diaria=100, qtd_total=1,
+            qtd_disponivel=1, tamanho='3x3') for i in range(self.threads)]
+
+        aceitas, recusadas, erros = [], [], []
+        data_disputada = date.today() + timedelta(days=30)
+
+        def reservar(brinquedo, dia):
+            serializer = LocacaoSerializer(data={
+                'cliente': cliente.id, 'brinquedos_ids': [brinquedo.id],
+                'data_festa': dia, 'hora_festa': '14:00', 'hora_montagem': '12:00',
+                'data_desmontagem': dia, 'hora_desmontagem': '20:00', 'montador': 'Equipe',
+                'qtd_parcelas': 1, 'cep': '00000-000', 'endereco': 'Rua',
+                'cidade': 'Cidade', 'uf': 'SP',
+            })
+            serializer.is_valid(raise_exception=True)
+            try:
+                serializer.save(organization=org)
+                aceitas.append(brinquedo.id)
+            except ValidationError:
+                recusadas.append(brinquedo.id)
+
+        def trabalhador(indice):
+            try:
+                for i in range(self.repeticoes):
+                    if indice % 2 == 0:
+                        reservar(disputado, data_disputada)
+                    else:
+                        reservar(proprios[indice],
+                                 data_disputada + timedelta(days=i))
+            except Exception as exc:
+                erros.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trabalhador, args=(i,))
+                   for i in range(self.threads)]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+
+        try:
+            reservas_disputado = Locacao.objects.filter(
+                brinquedos=disputado, data_festa=data_disputada).count()
+            tentativas = len(aceitas) + len(recusadas)
+            self.stdout.write(
+                f'{tentativas} tentativas em {duracao:.2f} s '
+                f'({tentativas / duracao:.1f}/s), {len(aceitas)} aceitas, '
+                f'{len(recusadas)} recusadas, {len(erros)} erros')
+            self.stdout.write(
+                f'Brinquedo disputado: {reservas_disputado} reserva(s) para 2 unidades')
+            if erros:
+                raise CommandError(f'Erros nas threads: {erros[:3]}')
+            if reservas_disputado > disputado.qtd_total:
+                raise CommandError('Overbooking detectado!')
+        finally:
+            Locacao.objects.filter(organization=org).delete()
+            user.delete()
+
+    def benchmark_dashboard(self):
+        """
+        Dashboard completo (sem cache) de uma organização com muitos
+        brinquedos, locações e transações: seções em sequência x em paralelo.
+        """
+        from core.dashboard import calcular_dashboard
+        from core.financeiro import agregar_transacoes
+
+        user, org = self.criar_organizacao('benchmark-dashboard')
+        try:
+            cliente = Cliente.objects.create(
+                organization=org, nome='Cliente Benchmark', documento='000', telefone='000',
+                cep='00000-000', endereco='Rua', cidade='Cidade', uf='SP')
+            brinquedos = Brinquedo.objects.bulk_create([Brinquedo(
+                organization=org, nome=f'Brinquedo {i}', valor_diaria=100, qtd_total=1,
+                qtd_disponivel=1, tamanho='3x3', valor_compra=1000 + i) for i in range(self.brinquedos)])
+
+            # Três anos de locações semanais por brinquedo (direto no banco,
+            # sem os signals, para montar a massa rápido)
+            hoje = date.today()
+            locacoes = Locacao.objects.bulk_create([Locacao(
+                organization=org, cliente=cliente, data_festa=hoje - timedelta(days=7 * semana),
+                hora_festa='14:00', hora_montagem='12:00',
+                data_desmontagem=hoje - timedelta(days=7 * semana), hora_desmontagem='20:00',
+                montador='Equipe', qtd_parcelas=1, valor_total=300, cep='00000-000',
+                endereco='Rua', cidade='Cidade', uf='SP',
+            ) for _brinquedo in brinquedos for semana in range(156)], batch_size=1000)
+            Locacao.brinquedos.through.objects.bulk_create([
+                Locacao.brinquedos.through(locacao_id=locacao.id, brinquedo_id=brinquedo.id)
+                for brinquedo, locacao in zip(
+                    [b for b in brinquedos for _semana in range(156)], locacoes)
+            ], batch_size=1000)
+            Transacoes.objects.bulk_create([Transacoes(
+                organization=org, locacao=locacao, cliente=cliente,
+                data_transacao=locacao.data_festa, tipo='entrada', valor=300,
+                categoria='aluguel', pagamento='pago', origem='locacao',
+            ) for locacao in locacoes] + [Transacoes(
+                organization=org, brinquedo=brinquedo, data_transacao=hoje - timedelta(days=30 * mes),
+                tipo='saida', valor=50, categoria='manutencao', pagamento='pago', origem='manual',
+            ) for brinquedo in brinquedos for mes in range(36)], batch_size=1000)
+            ResumoFinanceiroMensal.objects.bulk_create(agregar_transacoes(
+                Transacoes.objects.filter(organization=org)))
+
+            self.stdout.write(
+                f'{len(brinquedos)} brinquedos, {len(locacoes)} locações')
+            with override_settings(DASHBOARD_WORKERS=1):
+                self.medir('dashboard (sequencial)',
+                           lambda: calcular_dashboard(org))
+            # As queries das outras threads não entram na contagem
+            self.medir(f'dashboard ({settings.DASHBOARD_WORKERS} threads)',
+                       lambda: calcular_dashboard(org))
+            with override_settings(DASHBOARD_WORKERS=1):
+                sequencial = calcular_dashboard(org)
+            if calcular_dashboard(org) != sequencial:
+                raise CommandError('O cálculo em paralelo divergiu do sequencial.')
+        finally:
+            self.apagar_sem_signals(
+                Transacoes.objects.filter(organization=org))
+            self.apagar_sem_signals(
+                Locacao.brinquedos.through.objects.filter(locacao__organization=org))
+            self.apagar_sem_signals(Locacao.objects.filter(organization=org))
+            user.delete()
+
+    def benchmark_locacoes(self):
+        """
+        Criação e edição de uma locação com 3 brinquedos e 12 parcelas pelo
+        serializer, incluindo o recálculo de valores e parcelas feito no fim
+        da transação. Falha se passar do orçamento de queries.
+        """
+        user, org = self.criar_organizacao('benchmark-locacoes')
+        try:
+            cliente = Cliente.objects.create(
+                organization=org, nome='Cliente Benchmark', documento='000', telefone='000',
+                cep='00000-000', endereco='Rua', cidade='Cidade', uf='SP')
+            brinquedos = [Brinquedo.objects.create(
+                organization=org, nome=f'Brinquedo {i}', valor_diaria=100 + i, qtd_total=1000,
+                qtd_disponivel=1000, tamanho='3x3') for i in range(6)]
+            dia = date.today() + timedelta(days=30)
+            locacoes = []
+
+            def criar():
+                serializer = LocacaoSerializer(data={
+                    'cliente': cliente.id, 'brinquedos_ids': [b.id for b in brinquedos[:3]],
+                    'data_festa': dia, 'hora_festa': '14:00', 'hora_montagem': '12:00',
+                    'data_desmontagem': dia, 'hora_desmontagem': '20:00', 'montador': 'Equipe',
+                    'qtd_parcelas': 12, 'acrescimos': '50.00', 'cep': '00000-000',
+                    'endereco': 'Rua', 'cidade': 'Cidade', 'uf': 'SP',
+                })
+                serializer.is_valid(raise_exception=True)
+                locacoes.append(serializer.save(organization=org))
+
+            def editar():
+                # Cada locação criada troca os 3 brinquedos pelos outros 3
+                locacao = locacoes.pop(0)
+                serializer = LocacaoSerializer(locacao, data={
+                    'brinquedos_ids': [b.id for b in brinquedos[3:]]}, partial=True)
+                serializer.is_valid(raise_exception=True)
+                locacoes.append(serializer.save())
+
+            queries = {
+                'criar': self.medir('locação (criar)', criar),
+                'editar': self.medir('locação (trocar brinquedos)', editar),
+            }
+
+            # Valores e parcelas têm que refletir os brinquedos gravados
+            for locacao in Locacao.objects.filter(organization=org).para_listagem():
+                parcelas = list(Transacoes.objects.filter(
+                    locacao=locacao).values_list('valor', flat=True))
+                esperado = locacao.total_brinquedos + locacao.acrescimos - locacao.descontos
+                if locacao.valor_total != esperado or len(parcelas) != 12 or any(
+                        abs(valor * 12 - esperado) > Decimal('0.12') for valor in parcelas):
+                    raise CommandError(
+                        f'Valores divergentes na locação {locacao.id}.')
+
+            estourados = [f'{nome}: {queries[nome]} > {limite}'
+                          for nome, limite in self.orcamento_locacoes.items()
+                          if queries[nome] > limite]
+            if estourados:
+                raise CommandError(
+                    f'Orçamento de queries excedido ({", ".join(estourados)}).')
+        finally:
+            Locacao.objects.filter(organization=org).delete()
+            user.delete()
+
+    def apagar_sem_signals(self, queryset):
+        """DELETE direto no banco, para descartar rápido uma massa grande de dados."""
+        sql, params = queryset.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {queryset.model._meta.db_table} WHERE id IN ({sql})', params)
+
+    def benchmark_roi(self):
+        """
+        Motor vetorizado de ROI/payback (core.analytics) x laço por
+        brinquedo com Decimal, sobre séries mensais sintéticas em memória.
+        """
+        import numpy as np
+        import pandas as pd
+
+        from core.analytics import calcular_indicadores
+
+        hoje = date.today()
+        gerador = np.random.default_rng(42)
+        meses = pd.period_range(
+            end=pd.Period(hoje, freq='M'), periods=self.meses, freq='M')
+        ids = pd.Index(range(1, self.brinquedos + 1), name='id')
+        # Cada brinquedo começa a alugar num mês aleatório do histórico
+        inicio = gerador.integers(0, self.meses, self.brinquedos)
+        ativo = np.arange(self.meses)[None, :] >= inicio[:, None]
+        receita = pd.DataFrame(
+            np.where(ativo, gerador.integers(0, 8, ativo.shape) * 150.0, 0.0),
+            index=ids, columns=meses)
+        manutencao = pd.DataFrame(
+            np.where(ativo & (gerador.random(ativo.shape) < 0.1), 80.0, 0.0),
+            index=ids, columns=meses)
+        brinquedos = pd.DataFrame({
+            'nome': [f'Brinquedo {i}' for i in ids],
+            'status': 'ativo',
+            'valor_compra': gerador.integers(10, 60, self.brinquedos) * 100.0,
+            'primeira_locacao': [meses[i].start_time.date() for i in inicio],
+        }, index=ids)
+
+        # Mesmos dados no formato do laço: listas de Decimal por brinquedo
+        por_brinquedo = [(
+            brinquedo_id, Decimal(str(brinquedos.at[brinquedo_id, 'valor_compra'])),
+            brinquedos.at[brinquedo_id, 'primeira_locacao'],
+            [Decimal(str(v)) for v in receita.loc[brinquedo_id]],
+            [Decimal(str(v)) for v in manutencao.loc[brinquedo_id]],
+        ) for brinquedo_id in ids]
+
+        def laco():
+            resultado = {}
+            for brinquedo_id, valor_compra, primeira, receitas, manutencoes in por_brinquedo:
+                receita_total = sum(receitas, Decimal('0.00'))
+                custo_total = valor_compra + sum(manutencoes, Decimal('0.00'))
+                roi = Decimal('0.00')
+                if custo_total > 0:
+                    roi = (receita_total - custo_total) / custo_total * 100
+                meses_operacao = (hoje.year - primeira.year) * \
+                    12 + hoje.month - primeira.month + 1
+                media = receita_total / meses_operacao if meses_operacao > 0 else Decimal('0.00')
+                recente = sum(receitas[-6:], Decimal('0.00')) / 6
+                saldo, mes_payback = -valor_compra, None
+                for mes, entrada, saida in zip(meses, receitas, manutencoes):
+                    saldo += entrada - saida
+                    if saldo >= 0:
+                        mes_payback = str(mes)
+                        break
+                resultado[brinquedo_id] = (roi, media, recente, mes_payback)
+            return resultado
+
+        def vetorizado():
+            return calcular_indicadores(brinquedos, receita, manutencao, hoje=hoje)
+
+        self.stdout.write(
+            f'{self.brinquedos} brinquedos x {self.meses} meses')
+        self.medir('ROI/payback (laço com Decimal)', laco)
+        self.medir('ROI/payback (NumPy/pandas)', vetorizado)
+
+        # Os dois caminhos têm que chegar aos mesmos números
+        esperado, calculado = laco(), vetorizado()
+        for brinquedo_id, (roi, media, recente, _mes) in esperado.items():
+            linha = calculado.loc[brinquedo_id]
+            if (abs(float(roi) - linha.roi_percentual) > 0.01
+                    or abs(float(media) - linha.receita_mensal_media) > 0.01
+                    or abs(float(recente) - linha.receita_mensal_recente) > 0.01):
+                raise CommandError(
+                    f'Resultado divergente no brinquedo {brinquedo_id}.')
+
+    def benchmark_parcelas(self):
+        """
+        Transação manual parcelada por quantidade de parcelas: expansão em
+        lote (signal criar_parcelas_manuais) x uma create() por parcela.
+        """
+        _user, org = self.criar_organizacao('benchmark-parcelas')
+        hoje = date.today()
+
+        def dados(qtd_parcelas, parcela_atual=1, data=hoje, parcelado='sim'):
+            return dict(
+                organization=org, tipo='saida', categoria='compra', pagamento='planejado',
+                origem='manual', parcelado=parcelado, valor=Decimal('100.00'), data_transacao=data,
+                qtd_parcelas=qtd_parcelas, parcela_atual=parcela_atual,
+                descricao=f'Compra (Parcela {parcela_atual}/{qtd_parcelas})')
+
+        def em_lote(qtd_parcelas):
+            Transacoes.objects.create(**dados(qtd_parcelas))
+
+        def uma_a_uma(qtd_parcelas):
+            # Como era antes: cada parcela passa por todos os signals
+            # (parcelado='nao' só para a 1ª não ser expandida em lote)
+            for i in range(1, qtd_parcelas + 1):
+                Transacoes.objects.create(**dados(
+                    qtd_parcelas, i, hoje + relativedelta(months=i - 1), 'nao'))
+
+        for qtd_parcelas in (2, 6, 12, 24, 36):
+            self.medir(f'{qtd_parcelas} parcelas (uma a uma)',
+                       lambda: uma_a_uma(qtd_parcelas))
+            self.medir(f'{qtd_parcelas} parcelas (em lote)',
+                       lambda: em_lote(qtd_parcelas))
+
+        # A expansão em lote tem que gerar as mesmas parcelas
+        ultimo_id = Transacoes.objects.order_by('-id').values_list('id', flat=True).first()
+        em_lote(12)
+        parcelas = list(Transacoes.objects.filter(id__gt=ultimo_id).order_by(
+            'parcela_atual').values_list('parcela_atual', 'data_transacao', 'valor'))
+        if parcelas != [(i, hoje + relativedelta(months=i - 1), Decimal('100.00'))
+                        for i in range(1, 13)]:
+            raise CommandError('As parcelas geradas em lote divergiram.')
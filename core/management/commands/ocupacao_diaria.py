@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+
+from core.availability import calcular_ocupacao
+from core.models import Locacao, OcupacaoDiaria, Organization
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói (ou apenas verifica) a tabela de ocupação diária dos brinquedos a partir das locações'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='Só compara a tabela com as locações, sem alterar nada')
+        parser.add_argument(
+            '--organizacao', type=int,
+            help='ID de uma organização específica (padrão: todas)')
+
+    def handle(self, *args, **options):
+        organizacoes = Organization.objects.order_by('id')
+        if options['organizacao']:
+            organizacoes = organizacoes.filter(id=options['organizacao'])
+
+        divergentes = 0
+        for org in organizacoes:
+            esperado = self.ocupacao_esperada(org)
+            atual = {
+                (brinquedo_id, dia): reservados
+                for brinquedo_id, dia, reservados in OcupacaoDiaria.objects.filter(
+                    organization=org).values_list('brinquedo_id', 'dia', 'reservados')
+            }
+            diferencas = sum(
+                1 for chave in esperado.keys() | atual.keys()
+                if esperado.get(chave) != atual.get(chave))
+
+            if options['verificar']:
+                if diferencas:
+                    divergentes += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'{org}: {diferencas} dia(s) divergente(s)'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{org}: OK'))
+                continue
+
+            with transaction.atomic():
+                OcupacaoDiaria.objects.filter(organization=org).delete()
+                OcupacaoDiaria.objects.bulk_create([
+                    OcupacaoDiaria(organization=org, brinquedo_id=brinquedo_id,
+                                   dia=dia, reservados=reservados)
+                    for (brinquedo_id, dia), reservados in esperado.items()
+                ], batch_size=1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'{org}: {len(esperado)} linha(s) gravada(s), {diferencas} corrigida(s)'))
+
+        if divergentes:
+            raise CommandError(
+                f'{divergentes} organização(ões) com ocupação divergente.')
+
+    def ocupacao_esperada(self, org):
+        """{(brinquedo_id, dia): reservados} recalculado das locações."""
+        periodo = Locacao.objects.filter(organization=org).aggregate(
+            inicio=Min('data_festa'), fim=Max('data_desmontagem'))
+        if periodo['inicio'] is None or periodo['fim'] < periodo['inicio']:
+            return {}
+
+        return {
+            (brinquedo_id, periodo['inicio'] + timedelta(days=i)): reservados
+            for brinquedo_id, por_dia in calcular_ocupacao(
+                org, periodo['inicio'], periodo['fim']).items()
+            for i, reservados in enumerate(por_dia) if reservados
+        }
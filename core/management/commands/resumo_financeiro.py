@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.financeiro import agregar_transacoes
+from core.models import Organization, ResumoFinanceiroMensal, SaldoMensal, Transacoes
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói (ou apenas verifica) o resumo financeiro mensal a partir das transações'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='Só compara o resumo com as transações, sem alterar nada')
+        parser.add_argument(
+            '--organizacao', type=int,
+            help='ID de uma organização específica (padrão: todas)')
+
+    def handle(self, *args, **options):
+        organizacoes = Organization.objects.order_by('id')
+        if options['organizacao']:
+            organizacoes = organizacoes.filter(id=options['organizacao'])
+
+        divergentes = 0
+        for org in organizacoes:
+            esperado = agregar_transacoes(
+                Transacoes.objects.filter(organization=org))
+            chave = ('mes', 'tipo', 'categoria', 'pagamento')
+            valores_esperados = {
+                tuple(getattr(linha, campo) for campo in chave): (linha.total, linha.quantidade)
+                for linha in esperado
+            }
+            valores_atuais = {
+                linha[:4]: linha[4:]
+                for linha in ResumoFinanceiroMensal.objects.filter(organization=org).values_list(
+                    *chave, 'total', 'quantidade')
+            }
+            diferencas = sum(
+                1 for grupo in valores_esperados.keys() | valores_atuais.keys()
+                if valores_esperados.get(grupo) != valores_atuais.get(grupo))
+
+            if options['verificar']:
+                if diferencas:
+                    divergentes += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'{org}: {diferencas} grupo(s) divergente(s)'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{org}: OK'))
+                continue
+
+            with transaction.atomic():
+                # Os fechamentos de saldo derivam do resumo: são recriados sob demanda
+                SaldoMensal.objects.filter(organization=org).delete()
+                ResumoFinanceiroMensal.objects.filter(organization=org).delete()
+                ResumoFinanceiroMensal.objects.bulk_create(
+                    esperado, batch_size=1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'{org}: {len(esperado)} linha(s) gravada(s), {diferencas} corrigida(s)'))
+
+        if divergentes:
+            raise CommandError(
+                f'{divergentes} organização(ões) com resumo divergente.')
@@ -0,0 +1,67 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Cliente, Locacao, Transacoes
+
+
+class Command(BaseCommand):
+    help = 'Roda EXPLAIN nas consultas mais frequentes e confere se cada uma usa o índice esperado'
+
+    def consultas(self):
+        """Consultas quentes de views.py, tasks.py e dos signals → índice esperado."""
+        org_id = 1
+        hoje = date.today()
+        return [
+            ('Clientes ativos',
+             Cliente.objects.filter(organization_id=org_id, status='ativo'),
+             'cliente_org_status_idx'),
+            ('Listagem de locações',
+             Locacao.objects.filter(
+                 organization_id=org_id).order_by('data_festa'),
+             'locacao_org_data_festa_idx'),
+            ('Conflitos de datas (disponibilidade)',
+             Locacao.objects.filter(
+                 organization_id=org_id, data_festa__lte=hoje, data_desmontagem__gte=hoje),
+             'locacao_org_data_festa_idx'),
+            ('Festas montadas a recolher (task)',
+             Locacao.objects.filter(
+                 status='montado', data_desmontagem__lte=hoje
+             ).exclude(data_desmontagem=hoje, hora_desmontagem__gt='12:00'),
+             'locacao_status_desmont_idx'),
+            ('Listagem de transações por período',
+             Transacoes.objects.filter(
+                 organization_id=org_id, data_transacao__gte=hoje
+             ).order_by('-data_transacao', 'id'),
+             'transacao_org_data_idx'),
+            ('Parcelas de investimento do brinquedo',
+             Transacoes.objects.filter(
+                 brinquedo_id=1, origem='investimento_brinquedo', qtd_parcelas=12
+             ).order_by('parcela_atual'),
+             'transacao_brinq_origem_idx'),
+        ]
+
+    def handle(self, *args, **options):
+        falhas = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Em tabelas pequenas o Postgres prefere seq scan; aqui só
+                # interessa saber se o índice atende a consulta.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for nome, queryset, indice in self.consultas():
+                plano = queryset.explain()
+                if indice in plano:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'OK      {nome} → {indice}'))
+                else:
+                    falhas.append(nome)
+                    self.stdout.write(self.style.ERROR(
+                        f'FALHOU  {nome} → esperado {indice}'))
+                    self.stdout.write(plano)
+
+        if falhas:
+            raise CommandError(
+                f'{len(falhas)} consulta(s) sem o índice esperado.')
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['organization', 'status'], name='cliente_org_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locacao',
+            index=models.Index(fields=['organization', 'data_festa'], name='locacao_org_data_festa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locacao',
+            index=models.Index(fields=['status', 'data_desmontagem'], name='locacao_status_desmont_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacoes',
+            index=models.Index(fields=['organization', 'data_transacao', 'tipo', 'pagamento'], name='transacao_org_data_idx'),
+        ),
+    ]
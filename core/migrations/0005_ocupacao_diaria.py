@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:57
+
+import django.db.models.deletion
+from collections import Counter
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def preencher_ocupacao(apps, schema_editor):
+    """Popula a tabela a partir das locações já existentes."""
+    Locacao = apps.get_model('core', 'Locacao')
+    OcupacaoDiaria = apps.get_model('core', 'OcupacaoDiaria')
+
+    contagem = Counter()
+    reservas = Locacao.brinquedos.through.objects.values_list(
+        'locacao__organization_id', 'brinquedo_id',
+        'locacao__data_festa', 'locacao__data_desmontagem',
+    )
+    for organization_id, brinquedo_id, inicio, fim in reservas.iterator():
+        dia = inicio
+        while dia <= fim:
+            contagem[(organization_id, brinquedo_id, dia)] += 1
+            dia += timedelta(days=1)
+
+    OcupacaoDiaria.objects.bulk_create([
+        OcupacaoDiaria(organization_id=organization_id, brinquedo_id=brinquedo_id,
+                       dia=dia, reservados=reservados)
+        for (organization_id, brinquedo_id, dia), reservados in contagem.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_auth_user_email_lower_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacaoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('reservados', models.PositiveIntegerField(default=0)),
+                ('brinquedo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacoes', to='core.brinquedo')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacoes', to='core.organization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'dia'], name='ocupacao_org_dia_idx')],
+                'constraints': [models.UniqueConstraint(fields=('brinquedo', 'dia'), name='ocupacao_brinquedo_dia_unica')],
+            },
+        ),
+        migrations.RunPython(preencher_ocupacao, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def preencher_resumo(apps, schema_editor):
+    """Popula o resumo a partir das transações já existentes."""
+    Transacoes = apps.get_model('core', 'Transacoes')
+    ResumoFinanceiroMensal = apps.get_model('core', 'ResumoFinanceiroMensal')
+
+    linhas = Transacoes.objects.order_by().annotate(mes=TruncMonth('data_transacao')).values(
+        'organization_id', 'mes', 'tipo', 'categoria', 'pagamento'
+    ).annotate(total=Sum('valor'), quantidade=Count('id'))
+    ResumoFinanceiroMensal.objects.bulk_create(
+        [ResumoFinanceiroMensal(**linha) for linha in linhas], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_ocupacao_diaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoFinanceiroMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('saida', 'Saida')], max_length=8)),
+                ('categoria', models.CharField(choices=[('aluguel', 'Aluguel'), ('manutencao', 'Manutenção'), ('salario', 'Salário'), ('compra', 'Compra'), ('investimento', 'Investimento'), ('pagamento', 'Pagamento'), ('combustivel', 'Combustível'), ('outro', 'Outro')], max_length=12)),
+                ('pagamento', models.CharField(choices=[('pago', 'Pago'), ('entrada', 'Entrada'), ('nao_pago', 'Não Pago'), ('planejado', 'Planejado'), ('cancelado', 'Cancelado')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_financeiros', to='core.organization')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('organization', 'mes', 'tipo', 'categoria', 'pagamento'), name='resumo_financeiro_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
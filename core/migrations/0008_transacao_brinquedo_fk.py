@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:34
+
+import re
+
+from django.db import migrations, models
+
+ID_NA_DESCRICAO = re.compile(r'\(ID (\d+)\)')
+
+
+def preencher_brinquedo(apps, schema_editor):
+    """
+    Liga ao brinquedo as parcelas de investimento antigas que só tinham o id
+    na descrição ("... (ID 12)"), para os signals buscarem pela FK.
+    """
+    Transacoes = apps.get_model('core', 'Transacoes')
+    Brinquedo = apps.get_model('core', 'Brinquedo')
+
+    pendentes = Transacoes.objects.filter(
+        brinquedo__isnull=True, origem='investimento_brinquedo',
+        descricao__contains='(ID ',
+    ).only('id', 'organization_id', 'descricao')
+
+    encontrados = {}
+    for transacao in pendentes.iterator():
+        encontrado = ID_NA_DESCRICAO.search(transacao.descricao)
+        if encontrado:
+            encontrados[transacao] = int(encontrado.group(1))
+
+    # Só liga a brinquedos existentes da mesma organização
+    organizacoes = dict(Brinquedo.objects.filter(
+        id__in=set(encontrados.values())).values_list('id', 'organization_id'))
+    atualizadas = []
+    for transacao, brinquedo_id in encontrados.items():
+        if brinquedo_id in organizacoes and organizacoes[brinquedo_id] == transacao.organization_id:
+            transacao.brinquedo_id = brinquedo_id
+            atualizadas.append(transacao)
+    Transacoes.objects.bulk_update(atualizadas, ['brinquedo'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_saldo_mensal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transacoes',
+            index=models.Index(fields=['brinquedo', 'origem', 'parcela_atual'], name='transacao_brinq_origem_idx'),
+        ),
+        migrations.RunPython(preencher_brinquedo, migrations.RunPython.noop),
+    ]
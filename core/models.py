@@ -3,7 +3,8 @@ from django.utils.timezone import make_aware
 from django.contrib.auth.models import User
 from datetime import datetime
 from decimal import Decimal
-from django.db.models import Sum
+from django.db.models import Sum, OuterRef, Subquery, DecimalField
+from django.db.models.functions import Coalesce
 import uuid
 
 
@@ -88,6 +89,13 @@ class Cliente(models.Model):
     complemento = models.CharField(
         max_length=100, null=True, blank=True)  # Opcional
 
+    class Meta:
+        indexes = [
+            # Listagem de clientes ativos da organização
+            models.Index(fields=['organization', 'status'],
+                         name='cliente_org_status_idx'),
+        ]
+
     def __str__(self):
         return f'{self.nome} - {self.documento}'
 
@@ -160,6 +168,26 @@ class Brinquedo(models.Model):
         return f'{self.nome} - {self.valor_diaria}'
 
 
+class LocacaoQuerySet(models.QuerySet):
+    def para_listagem(self):
+        """
+        Carrega cliente, brinquedos e o total dos brinquedos em um número
+        fixo de queries, independente da quantidade de locações.
+        """
+        total_brinquedos = Brinquedo.objects.filter(
+            locacao=OuterRef('pk')
+        ).order_by().values('locacao').annotate(
+            total=Sum('valor_diaria')).values('total')
+
+        return self.select_related('cliente').prefetch_related(
+            'brinquedos'
+        ).annotate(
+            total_brinquedos=Coalesce(
+                Subquery(total_brinquedos), Decimal('0.00'),
+                output_field=DecimalField(max_digits=10, decimal_places=2))
+        )
+
+
 class Locacao(models.Model):
     DURACAO_CHOICES = [
         ('3h', '3 hora'),
@@ -233,6 +261,18 @@ class Locacao(models.Model):
     complemento = models.CharField(
         max_length=100, null=True, blank=True)  # Opcional
 
+    objects = LocacaoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listagem por data e busca de conflitos de datas da organização
+            models.Index(fields=['organization', 'data_festa'],
+                         name='locacao_org_data_festa_idx'),
+            # Task periódica que procura festas montadas já encerradas
+            models.Index(fields=['status', 'data_desmontagem'],
+                         name='locacao_status_desmont_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         """Sempre recalcula o valor_restante baseado no total e entrada."""
         entrada = self.valor_entrada or Decimal("0.00")
@@ -242,7 +282,11 @@ class Locacao(models.Model):
     @property
     def valor_total_calculado(self):
         """Calcula total em tempo real (sem salvar)."""
-        total_brinquedos = sum(b.valor_diaria for b in self.brinquedos.all())
+        # Usa o total anotado por para_listagem() quando disponível
+        total_brinquedos = getattr(self, 'total_brinquedos', None)
+        if total_brinquedos is None:
+            total_brinquedos = sum(
+                b.valor_diaria for b in self.brinquedos.all())
         return total_brinquedos + (self.acrescimos or Decimal('0.00')) - (self.descontos or Decimal('0.00'))
 
     @property
@@ -348,18 +392,140 @@ class Transacoes(models.Model):
         verbose_name = "Transação"
         verbose_name_plural = "Transações"
         ordering = ['-data_transacao', 'id']
+        indexes = [
+            # Listagem paginada e filtros por data/tipo/pagamento
+            models.Index(fields=['organization', 'data_transacao', 'tipo', 'pagamento'],
+                         name='transacao_org_data_idx'),
+            # Parcelas de investimento de um brinquedo (signals do Brinquedo)
+            models.Index(fields=['brinquedo', 'origem', 'parcela_atual'],
+                         name='transacao_brinq_origem_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id} - {self.data_transacao} - {self.tipo} - {self.valor} - {self.categoria}'
 
     @classmethod
-    def saldo_ate(cls, data):
-        entradas = cls.objects.filter(data_transacao__lte=data, tipo='entrada', status='pago').aggregate(
-            Sum('valor'))['valor__sum'] or 0
-        saidas = cls.objects.filter(data_transacao__lte=data, tipo='saida', status='pago').aggregate(
-            Sum('valor'))['valor__sum'] or 0
-        return entradas - saidas
+    def saldo_ate(cls, organization, data):
+        """
+        Saldo (entradas - saídas com pagamento 'pago' ou 'entrada', ver
+        financeiro.PAGAMENTOS_DO_SALDO) da organização até a data, inclusive.
+        Usa o fechamento do mês anterior (SaldoMensal) e soma só o mês da data.
+        """
+        from .financeiro import saldo_ate
+        return saldo_ate(organization, data)
 
     @property
     def is_parcela(self):
         return self.qtd_parcelas and self.qtd_parcelas > 1
+
+
+class VersaoRecurso(models.Model):
+    """
+    Contador de alterações por organização e recurso. Incrementado pelos
+    signals a cada escrita; usado para responder GETs condicionais (ETag).
+    """
+    RECURSO_CHOICES = [
+        ('clientes', 'Clientes'),
+        ('brinquedos', 'Brinquedos'),
+        ('locacoes', 'Locações'),
+        ('transacoes', 'Transações'),
+    ]
+
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="versoes"
+    )
+    recurso = models.CharField(max_length=20, choices=RECURSO_CHOICES)
+    versao = models.PositiveBigIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'recurso'], name='versao_recurso_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.organization_id} - {self.recurso} - v{self.versao}'
+
+
+class OcupacaoDiaria(models.Model):
+    """
+    Unidades reservadas de cada brinquedo em cada dia, mantida pelos signals
+    de Locacao. Permite consultar disponibilidade por faixa de datas sem
+    percorrer o histórico de locações.
+    """
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="ocupacoes"
+    )
+    brinquedo = models.ForeignKey(
+        Brinquedo, on_delete=models.CASCADE, related_name="ocupacoes"
+    )
+    dia = models.DateField()
+    reservados = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['brinquedo', 'dia'], name='ocupacao_brinquedo_dia_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'dia'],
+                         name='ocupacao_org_dia_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.brinquedo_id} - {self.dia} - {self.reservados}'
+
+
+class ResumoFinanceiroMensal(models.Model):
+    """
+    Soma e quantidade de transações por mês, tipo, categoria e situação de
+    pagamento, mantida pelos signals de Transacoes. Os gráficos do dashboard
+    leem algumas dezenas de linhas daqui em vez do histórico inteiro.
+    """
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="resumos_financeiros"
+    )
+    mes = models.DateField()  # Sempre o dia 1 do mês
+    tipo = models.CharField(max_length=8, choices=Transacoes.TIPO_CHOICES)
+    categoria = models.CharField(
+        max_length=12, choices=Transacoes.CATEGORIA_CHOICES)
+    pagamento = models.CharField(
+        max_length=10, choices=Transacoes.STATUS_CHOICES)
+    total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    quantidade = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'mes', 'tipo',
+                        'categoria', 'pagamento'],
+                name='resumo_financeiro_unico'),
+        ]
+
+    def __str__(self):
+        return f'{self.organization_id} - {self.mes:%m/%Y} - {self.tipo} - {self.categoria} - {self.total}'
+
+
+class SaldoMensal(models.Model):
+    """
+    Saldo acumulado da organização no fechamento de cada mês, criado sob
+    demanda por Transacoes.saldo_ate() a partir do ResumoFinanceiroMensal.
+    Alterações em transações de um mês apagam os fechamentos daquele mês em
+    diante (são recriados na próxima consulta).
+    """
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="saldos_mensais"
+    )
+    mes = models.DateField()  # Sempre o dia 1 do mês
+    saldo = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'mes'], name='saldo_mensal_unico'),
+        ]
+
+    def __str__(self):
+        return f'{self.organization_id} - {self.mes:%m/%Y} - {self.saldo}'
@@ -0,0 +1,82 @@
+import base64
+import json
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TransacoesCursorPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) ordenada por (-data_transacao, id).
+
+    O cursor guarda a última (data_transacao, id) entregue, então a próxima
+    página é um filtro "depois desta chave" + LIMIT, com o mesmo custo na
+    primeira página ou na milésima (sem OFFSET).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        posicao = self.decode_cursor(request)
+        if posicao is not None:
+            data_transacao, pk = posicao
+            queryset = queryset.filter(
+                Q(data_transacao__lt=data_transacao) |
+                Q(data_transacao=data_transacao, id__gt=pk)
+            )
+
+        # Busca um registro a mais só para saber se existe próxima página
+        resultados = list(queryset.order_by(
+            '-data_transacao', 'id')[:self.page_size + 1])
+        self.has_next = len(resultados) > self.page_size
+        self.page = resultados[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(
+                encoded.encode('ascii')).decode('utf-8'))
+            return date.fromisoformat(payload['d']), int(payload['id'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, transacao):
+        payload = json.dumps(
+            {'d': transacao.data_transacao.isoformat(), 'id': transacao.id})
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8'))
+        return encoded.decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -0,0 +1,92 @@
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Locacao
+
+# Locações marcadas para recálculo dentro do bloco recalculo_adiado() atual
+# (por thread, como as conexões do Django)
+_fila = threading.local()
+
+
+@contextmanager
+def recalculo_adiado():
+    """
+    Agrupa os recálculos de valores pedidos dentro do bloco: cada locação
+    marcada é recalculada uma única vez, no fim do bloco. Abra-o dentro do
+    transaction.atomic() da escrita, para o recálculo ser confirmado (ou
+    desfeito) junto com ela. Se o bloco falhar, a fila é descartada.
+    """
+    if getattr(_fila, 'locacoes', None) is not None:
+        yield  # Bloco aninhado: quem abriu a fila processa
+        return
+
+    _fila.locacoes = {}
+    try:
+        yield
+        locacoes = _fila.locacoes
+    finally:
+        _fila.locacoes = None
+    if locacoes:
+        recalcular_valores(locacoes)
+
+
+def marcar_locacao(locacao):
+    """
+    Pede o recálculo dos valores de uma locação (instância ou id). Fora de
+    recalculo_adiado() o recálculo roda na hora.
+    """
+    locacao_id = getattr(locacao, 'pk', locacao)
+    instancia = locacao if isinstance(locacao, Locacao) else None
+    fila = getattr(_fila, 'locacoes', None)
+    if fila is None:
+        recalcular_valores({locacao_id: instancia})
+    elif fila.get(locacao_id) is None:
+        fila[locacao_id] = instancia
+
+
+def recalcular_valores(locacoes):
+    """
+    Recalcula valor_total (brinquedos + acréscimos - descontos), a entrada
+    sugerida e o restante de cada locação ({id: instância ou None}) com uma
+    única consulta agregada, e salva só as que mudaram. O save sincroniza as
+    parcelas (sync_locacao_to_transacao). As instâncias recebidas são
+    atualizadas no lugar, para a resposta da API sair com os valores novos.
+    """
+    totais = dict(Locacao.brinquedos.through.objects.filter(
+        locacao_id__in=locacoes
+    ).order_by().values_list('locacao_id').annotate(
+        total=Sum('brinquedo__valor_diaria')))
+
+    faltantes = [pk for pk, instancia in locacoes.items() if instancia is None]
+    carregadas = {l.pk: l for l in Locacao.objects.filter(id__in=faltantes)}
+
+    alteradas = []
+    for pk in sorted(locacoes):
+        locacao = locacoes[pk] or carregadas.get(pk)
+        if locacao is None:
+            continue  # Excluída antes do recálculo
+
+        valor_total = totais.get(pk, Decimal('0.00')) + \
+            (locacao.acrescimos or Decimal('0.00')) - \
+            (locacao.descontos or Decimal('0.00'))
+
+        # Se não foi informado entrada, sugere 30%
+        valor_entrada = locacao.valor_entrada
+        if not valor_entrada or valor_entrada == Decimal("0.00"):
+            valor_entrada = (valor_total * Decimal("0.3")).quantize(Decimal("0.01"))
+
+        if (locacao.valor_total, locacao.valor_entrada) != (valor_total, valor_entrada):
+            locacao.valor_total = valor_total
+            locacao.valor_entrada = valor_entrada
+            alteradas.append(locacao)
+
+    if not alteradas:
+        return
+    with transaction.atomic():
+        for locacao in alteradas:
+            locacao.save(update_fields=[
+                'valor_total', 'valor_entrada', 'valor_restante'])
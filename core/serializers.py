@@ -1,10 +1,81 @@
 from decimal import Decimal
+from django.db import transaction
 from rest_framework import serializers
 from .models import Cliente, Brinquedo, Locacao, ContratoAnexo, Transacoes
+from .availability import disponibilidade
+from .recalculo import recalculo_adiado
+
+
+# Permite escolher os campos (?fields=) e expandir aninhados (?expand=)
+class CamposDinamicosMixin:
+    """
+    Aceita os kwargs `fields` (lista de campos a manter) e `expand`
+    (objetos aninhados a incluir, declarados em `campos_expansiveis`).
+    Com `otimizar_queryset` a consulta busca só as colunas necessárias.
+    """
+    # nome do campo → (classe do serializer, kwargs)
+    campos_expansiveis = {}
+    # campo do serializer → colunas extras que ele lê do modelo
+    dependencias_campos = {}
+
+    def __init__(self, *args, **kwargs):
+        campos = kwargs.pop('fields', None)
+        expandir = kwargs.pop('expand', None) or []
+        super().__init__(*args, **kwargs)
+
+        for nome in expandir:
+            if nome in self.campos_expansiveis:
+                serializer_class, opcoes = self.campos_expansiveis[nome]
+                self.fields[nome] = serializer_class(**opcoes)
+
+        self.campos_escolhidos = campos
+        if campos:
+            for nome in set(self.fields) - set(campos) - {'id'}:
+                self.fields.pop(nome)
+
+    def origem_do_campo(self, nome, campo):
+        """Nome do campo do modelo por trás de um campo do serializer."""
+        origem = campo.source.split('.')[0]
+        if origem.startswith('get_') and origem.endswith('_display'):
+            return origem[len('get_'):-len('_display')]
+        if origem == '*' and nome.endswith('_display'):
+            return nome[:-len('_display')]
+        return origem
+
+    def otimizar_queryset(self, queryset, *colunas_extras):
+        """
+        Restringe o SELECT às colunas usadas pelos campos escolhidos e só
+        faz join/prefetch das relações que serão serializadas.
+        """
+        campos_modelo = {
+            f.name: f for f in self.Meta.model._meta.get_fields()}
+        colunas, select, prefetch = {'id', *colunas_extras}, [], []
+        for nome, campo in self.fields.items():
+            if campo.write_only:
+                continue
+            origens = [self.origem_do_campo(nome, campo)]
+            origens += self.dependencias_campos.get(nome, [])
+            for origem in origens:
+                field = campos_modelo.get(origem)
+                if field is None:
+                    continue
+                if field.many_to_many:
+                    prefetch.append(origem)
+                elif field.concrete:
+                    colunas.add(origem)
+                    if field.is_relation and isinstance(campo, serializers.BaseSerializer):
+                        select.append(origem)
+
+        if self.campos_escolhidos:
+            queryset = queryset.select_related(None).prefetch_related(
+                None).only(*colunas).prefetch_related(*prefetch)
+        if select:
+            queryset = queryset.select_related(*select)
+        return queryset
 
 
 # Serializa todos os campos do Cliente + exibe status legível (ex: 'ativo' → 'Ativo')
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     status_display = serializers.SerializerMethodField()
 
     class Meta:
@@ -18,7 +89,7 @@ class ClienteSerializer(serializers.ModelSerializer):
 
 
 # Serializa todos os campos do Brinquedo + status e voltagem legíveis
-class BrinquedoSerializer(serializers.ModelSerializer):
+class BrinquedoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     status_display = serializers.SerializerMethodField()
     voltagem_display = serializers.SerializerMethodField()
     valor_diaria = serializers.DecimalField(
@@ -46,7 +117,7 @@ class BrinquedoSerializer(serializers.ModelSerializer):
 
 
 # Serializa todos os campos da Locacao + status legível
-class LocacaoSerializer(serializers.ModelSerializer):
+class LocacaoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     brinquedos_ids = serializers.PrimaryKeyRelatedField(
         queryset=Brinquedo.objects.all(), many=True, source='brinquedos', write_only=True
     )
@@ -63,6 +134,11 @@ class LocacaoSerializer(serializers.ModelSerializer):
         source='get_pagamento_display', read_only=True
     )
 
+    # O total dos brinquedos vem anotado por Locacao.objects.para_listagem()
+    dependencias_campos = {
+        'valor_total_calculado': ['acrescimos', 'descontos'],
+    }
+
     class Meta:
         model = Locacao
         fields = '__all__'
@@ -73,32 +149,62 @@ class LocacaoSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['valor_total_calculado'] = instance.valor_total_calculado
+        if 'valor_total_calculado' in self.fields:
+            data['valor_total_calculado'] = instance.valor_total_calculado
         return data
 
+    def validar_disponibilidade(self, organization, brinquedos, data_festa, data_desmontagem, locacao=None):
+        """
+        Trava as linhas dos brinquedos envolvidos (SELECT ... FOR UPDATE, em
+        ordem de id para evitar deadlock) e confere se ainda há unidade livre
+        de cada um no período. Reservas de outros brinquedos não esperam.
+        """
+        ids = sorted({b.id for b in brinquedos})
+        if not ids:
+            return
+        list(Brinquedo.objects.select_for_update().filter(
+            id__in=ids).order_by('id').values_list('id', flat=True))
+
+        livres = disponibilidade(
+            organization, data_festa, data_desmontagem,
+            excluir_locacao=locacao.id if locacao else None, brinquedos=ids)
+        indisponiveis = [b.nome for b in brinquedos if livres.get(b.id, 0) < 1]
+        if indisponiveis:
+            raise serializers.ValidationError({
+                'brinquedos_ids': [
+                    f"Sem unidades livres no período: {', '.join(indisponiveis)}."]
+            })
+
     def create(self, validated_data):
         # Remove brinquedos_ids do validated_data para criar Locacao
         brinquedos = validated_data.pop('brinquedos', [])
-        locacao = super().create(validated_data)
-        locacao.brinquedos.set(brinquedos)
+        # Valores e parcelas recalculados uma vez só, no fim da transação
+        with transaction.atomic(), recalculo_adiado():
+            self.validar_disponibilidade(
+                validated_data.get('organization'), brinquedos,
+                validated_data['data_festa'], validated_data['data_desmontagem'])
+            locacao = super().create(validated_data)
+            locacao.brinquedos.set(brinquedos)
         return locacao
 
     def update(self, instance, validated_data):
         brinquedos = validated_data.pop('brinquedos', None)
-        locacao = super().update(instance, validated_data)
-        if brinquedos is not None:
-            locacao.brinquedos.set(brinquedos)
+        with transaction.atomic(), recalculo_adiado():
+            # Só revalida se mudou o período ou os brinquedos
+            if brinquedos is not None or 'data_festa' in validated_data or 'data_desmontagem' in validated_data:
+                self.validar_disponibilidade(
+                    instance.organization_id,
+                    brinquedos if brinquedos is not None else list(
+                        instance.brinquedos.all()),
+                    validated_data.get('data_festa', instance.data_festa),
+                    validated_data.get(
+                        'data_desmontagem', instance.data_desmontagem),
+                    locacao=instance)
+            locacao = super().update(instance, validated_data)
+            if brinquedos is not None:
+                locacao.brinquedos.set(brinquedos)
 
         return locacao
-        transacao = Transacoes.objects.filter(
-            locacao=instance,
-            origem='locacao'
-        ).first()
-        if transacao:
-            transacao.pagamento = 'cancelado'
-            transacao.descricao += " (Cancelada junto com a locação)"
-            transacao.save()
-        return transacao
 
 
 # Serializa o anexo do contrato de locação
@@ -123,7 +229,7 @@ class ContratoAnexoSerializer(serializers.ModelSerializer):
 
 
 # Serializa as transações
-class TransacoesSerializer(serializers.ModelSerializer):
+class TransacoesSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     pagamento_display = serializers.CharField(
         source='get_pagamento_display', read_only=True)
     tipo_display = serializers.CharField(
@@ -132,7 +238,12 @@ class TransacoesSerializer(serializers.ModelSerializer):
         source='get_categoria_display', read_only=True)
     origem_display = serializers.CharField(
         source='get_origem_display', read_only=True)
-    brinquedo = BrinquedoSerializer(read_only=True)
+    # Só o id por padrão; o objeto completo vem com ?expand=brinquedo
+    brinquedo = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    campos_expansiveis = {
+        'brinquedo': (BrinquedoSerializer, {'read_only': True}),
+    }
 
     class Meta:
         model = Transacoes
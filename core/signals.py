@@ -1,12 +1,23 @@
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
-from .models import Locacao, Transacoes, Brinquedo
+from .models import Locacao, Transacoes, Brinquedo, Cliente
+from .versioning import incrementar_versao
+from .availability import recalcular_ocupacao
+from .financeiro import recalcular_resumo
+from .dashboard import invalidar_dashboard
+from .recalculo import marcar_locacao
 from datetime import timedelta
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
 from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete, post_init
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import TextField, Value
+from django.db.models.functions import Concat
+from rest_framework.authtoken.models import Token
 from .models import Profile, Organization
+from .authentication import cache_tokens
 
 
 @receiver(post_save, sender=Transacoes)
@@ -37,12 +48,10 @@ def criar_parcelas_manuais(sender, instance, created, **kwargs):
     valor_parcela = (
         valor_total / instance.qtd_parcelas).quantize(Decimal("0.01"))
 
-    # Loop para criar as parcelas restantes (da 2ª em diante)
-    for i in range(2, instance.qtd_parcelas + 1):
-        data_nova_parcela = instance.data_transacao + relativedelta(months=i-1)
-
-        # Cria um objeto completamente novo em vez de "clonar" o existente
-        Transacoes.objects.create(
+    # Parcelas restantes (da 2ª em diante) num único INSERT, sem disparar
+    # os signals de cada linha; os efeitos colaterais vão em lote no fim
+    parcelas = [
+        Transacoes(
             # Copia os campos relevantes da primeira parcela
             organization=instance.organization,
             locacao=instance.locacao,
@@ -59,26 +68,44 @@ def criar_parcelas_manuais(sender, instance, created, **kwargs):
             valor=valor_parcela,
             qtd_parcelas=instance.qtd_parcelas,
             parcela_atual=i,
-            data_transacao=data_nova_parcela,
+            data_transacao=instance.data_transacao + relativedelta(months=i-1),
             descricao=f"{descricao_base} (Parcela {i}/{instance.qtd_parcelas})"
         )
+        for i in range(2, instance.qtd_parcelas + 1)
+    ]
+    with transaction.atomic():
+        Transacoes.objects.bulk_create(parcelas)
+        transacoes_gravadas_em_lote(
+            instance.organization_id, [p.data_transacao for p in parcelas])
 
 
 @receiver(m2m_changed, sender=Locacao.brinquedos.through)
-def atualizar_valores(sender, instance, action, **kwargs):
-    if action in ["post_add", "post_remove", "post_clear"]:
-        total_brinquedos = sum(
-            b.valor_diaria for b in instance.brinquedos.all())
-        instance.valor_total = total_brinquedos + \
-            (instance.acrescimos or Decimal('0.00')) - \
-            (instance.descontos or Decimal('0.00'))
+def guardar_relacionados_antes_do_clear(sender, instance, action, reverse, **kwargs):
+    # No post_clear o pk_set vem vazio: guarda aqui, antes, quem estava
+    # ligado. Os receivers de post_clear leem por relacionados_alterados()
+    if action == 'pre_clear':
+        relacionados = instance.locacao_set if reverse else instance.brinquedos
+        instance._relacionados_antes = list(
+            relacionados.values_list('id', flat=True))
+
 
-        # Se não foi informado entrada, sugere 30%
-        if not instance.valor_entrada or instance.valor_entrada == Decimal("0.00"):
-            instance.valor_entrada = instance.valor_total * Decimal("0.3")
+def relacionados_alterados(instance, action, pk_set):
+    """Ids do outro lado da relação tocados por um post_add/remove/clear."""
+    if action == 'post_clear':
+        return instance._relacionados_antes
+    return pk_set
 
-        instance.valor_restante = instance.valor_total - instance.valor_entrada
-        instance.save()
+
+@receiver(m2m_changed, sender=Locacao.brinquedos.through)
+def atualizar_valores(sender, instance, action, reverse, pk_set, **kwargs):
+    # Só marca a locação: o total é recalculado uma vez, no fim da escrita
+    # (ver core.recalculo), e não a cada add/remove/clear
+    if action in ["post_add", "post_remove", "post_clear"]:
+        if not reverse:
+            marcar_locacao(instance)
+            return
+        for locacao_id in relacionados_alterados(instance, action, pk_set):
+            marcar_locacao(locacao_id)
 
 
 @receiver(post_save, sender=Locacao)
@@ -89,39 +116,63 @@ def sync_locacao_to_transacao(sender, instance, created, **kwargs):
         qtd_parcelas = instance.qtd_parcelas or 1
         valor_parcela = instance.valor_total / qtd_parcelas
 
-        for i in range(1, qtd_parcelas + 1):
-            # calcula data da parcela: pode ser mensal ou igual a data_festa
-            data_parcela = instance.data_festa + relativedelta(months=i-1)
-
-            Transacoes.objects.create(
+        # Todas as parcelas num único INSERT; efeitos colaterais em lote
+        parcelas = [
+            Transacoes(
                 organization=instance.organization,
                 locacao=instance,
                 cliente=instance.cliente,
                 origem='locacao',
-                data_transacao=data_parcela,
+                # calcula data da parcela: pode ser mensal ou igual a data_festa
+                data_transacao=instance.data_festa + relativedelta(months=i-1),
                 tipo="entrada",
                 valor=valor_parcela,
                 categoria="aluguel",
                 pagamento=instance.pagamento,
                 descricao=f"Parcela {i}/{qtd_parcelas} da locação {instance.id}",
                 qtd_parcelas=qtd_parcelas,
+                parcela_atual=i,
             )
+            for i in range(1, qtd_parcelas + 1)
+        ]
+        with transaction.atomic():
+            Transacoes.objects.bulk_create(parcelas)
+            transacoes_gravadas_em_lote(
+                instance.organization_id, [p.data_transacao for p in parcelas])
     else:
-        # Atualiza apenas a primeira transação ou todas?
-        # Se quiser atualizar todas, percorra:
-        transacoes = Transacoes.objects.filter(locacao=instance)
+        # Reaplica os dados da locação nas parcelas, em ordem de parcela.
+        # Só as que mudaram são gravadas, num único UPDATE em lote: sem os
+        # signals de cada transação (que voltariam a salvar a locação)
         qtd_parcelas = instance.qtd_parcelas or 1
-        valor_parcela = instance.valor_total / qtd_parcelas
+        valor_parcela = (
+            instance.valor_total / qtd_parcelas).quantize(Decimal("0.01"))
 
+        alteradas, datas = [], set()
+        transacoes = Transacoes.objects.filter(
+            locacao=instance).order_by("parcela_atual", "id")
         for i, t in enumerate(transacoes, start=1):
-            t.data_transacao = instance.data_festa + relativedelta(months=i-1)
-            t.valor = valor_parcela
-            t.organization = instance.organization
-            t.pagamento = instance.pagamento
-            t.cliente = instance.cliente
-            t.descricao = f"Parcela {i}/{qtd_parcelas} da locação {instance.id}"
-            t.save(update_fields=["data_transacao", "valor",
-                   "pagamento", "descricao", "cliente"])
+            novos = {
+                "data_transacao": instance.data_festa + relativedelta(months=i-1),
+                "valor": valor_parcela,
+                "pagamento": instance.pagamento,
+                "cliente_id": instance.cliente_id,
+                "descricao": f"Parcela {i}/{qtd_parcelas} da locação {instance.id}",
+                "parcela_atual": i,
+            }
+            if all(getattr(t, campo) == valor for campo, valor in novos.items()):
+                continue
+            # O resumo precisa ser refeito no mês antigo e no novo da parcela
+            datas |= {t.data_transacao, novos["data_transacao"]}
+            for campo, valor in novos.items():
+                setattr(t, campo, valor)
+            alteradas.append(t)
+
+        if alteradas:
+            with transaction.atomic():
+                Transacoes.objects.bulk_update(alteradas, [
+                    "data_transacao", "valor", "pagamento", "cliente",
+                    "descricao", "parcela_atual"])
+                transacoes_gravadas_em_lote(instance.organization_id, datas)
 
 
 @receiver(post_save, sender=Transacoes)
@@ -148,14 +199,37 @@ def cancelar_transacao_com_locacao(sender, instance, **kwargs):
     Quando uma Locacao for deletada/cancelada,
     marca TODAS as Transacoes associadas como canceladas.
     """
-    # Mude de .first() para .filter() para pegar todas as transações
-    transacoes = Transacoes.objects.filter(locacao=instance, origem="locacao")
+    cancelar_transacoes(
+        Transacoes.objects.filter(locacao=instance, origem="locacao"),
+        instance.organization_id, " (Cancelada junto com a locação)")
+
+
+def cancelar_transacoes(transacoes, organization_id, sufixo):
+    """
+    Cancela as transações num único UPDATE (a descrição ganha o sufixo no
+    próprio banco; Concat trata descrição nula como vazia) e emite os
+    efeitos colaterais uma vez para o lote.
+    """
+    meses = list(transacoes.dates("data_transacao", "month"))
+    if not meses:
+        return
+    transacoes.update(
+        pagamento="cancelado",
+        descricao=Concat("descricao", Value(sufixo), output_field=TextField()),
+    )
+    transacoes_gravadas_em_lote(organization_id, meses)
+
+
+# Campos do Brinquedo que definem as parcelas de investimento
+CAMPOS_INVESTIMENTO = ('valor_compra', 'qtd_parcelas',
+                       'data_vencimento', 'data_aquisicao', 'nome')
 
-    # Percorra todas as transações e cancele uma por uma
-    for transacao in transacoes:
-        transacao.pagamento = "cancelado"
-        transacao.descricao += " (Cancelada junto com a locação)"
-        transacao.save(update_fields=["pagamento", "descricao"])
+
+@receiver(post_init, sender=Brinquedo)
+def guardar_valores_brinquedo(sender, instance, **kwargs):
+    # __dict__ para não disparar query em campos adiados (.only())
+    instance._investimento_salvo = tuple(
+        instance.__dict__.get(campo) for campo in CAMPOS_INVESTIMENTO)
 
 
 @receiver(post_save, sender=Brinquedo)
@@ -164,6 +238,10 @@ def sync_brinquedo_to_transacao(sender, instance, created, **kwargs):
     Cria ou atualiza transações do tipo 'investimento' para cada Brinquedo.
     Cada parcela é independente, permitindo controle de pagamento.
     """
+    antes = instance._investimento_salvo
+    instance._investimento_salvo = tuple(
+        instance.__dict__.get(campo) for campo in CAMPOS_INVESTIMENTO)
+
     if not instance.valor_compra:
         return  # Não cria transações se não tiver valor de compra
 
@@ -171,16 +249,8 @@ def sync_brinquedo_to_transacao(sender, instance, created, **kwargs):
     valor_total = Decimal(instance.valor_compra)
     org = instance.organization
 
-    if not created:
-        old = sender.objects.get(pk=instance.pk)
-        if (
-            old.valor_compra == instance.valor_compra
-            and old.qtd_parcelas == instance.qtd_parcelas
-            and old.data_vencimento == instance.data_vencimento
-            and old.data_aquisicao == instance.data_aquisicao
-            and old.nome == instance.nome
-        ):
-            return  # nada mudou → não atualiza transações
+    if not created and antes == instance._investimento_salvo:
+        return  # nada mudou → não atualiza transações
 
     # força 2 casas decimais
     valor_parcela = (valor_total / qtd_parcelas).quantize(Decimal("0.01"))
@@ -190,9 +260,9 @@ def sync_brinquedo_to_transacao(sender, instance, created, **kwargs):
 
     # Busca transações já criadas para esse brinquedo
     transacoes_existentes = list(Transacoes.objects.filter(
+        brinquedo=instance,
         origem="investimento_brinquedo",
         qtd_parcelas=qtd_parcelas,
-        descricao__icontains=f"(ID {instance.id})"
     ).order_by("parcela_atual"))
 
     for i in range(1, qtd_parcelas + 1):
@@ -230,10 +300,158 @@ def cancelar_transacao_brinquedo(sender, instance, **kwargs):
     """
     Quando um brinquedo for deletado, marca as transações de investimento como canceladas
     """
-    transacoes = Transacoes.objects.filter(
-        origem="investimento_brinquedo", descricao__icontains=f"Brinquedo {instance.id}"
+    cancelar_transacoes(
+        Transacoes.objects.filter(
+            brinquedo=instance, origem="investimento_brinquedo"),
+        instance.organization_id, " (Cancelada junto com o brinquedo)")
+
+
+# Versões por organização/recurso usadas nos GETs condicionais (ETag) e
+# invalidação do dashboard em cache
+@receiver(post_save, sender=Cliente)
+@receiver(pre_delete, sender=Cliente)
+def versao_clientes(sender, instance, **kwargs):
+    incrementar_versao(instance.organization_id, 'clientes')
+
+
+@receiver(post_save, sender=Brinquedo)
+@receiver(pre_delete, sender=Brinquedo)
+def versao_brinquedos(sender, instance, **kwargs):
+    incrementar_versao(instance.organization_id, 'brinquedos')
+    invalidar_dashboard(instance.organization_id)
+
+
+@receiver(post_save, sender=Locacao)
+@receiver(pre_delete, sender=Locacao)
+@receiver(m2m_changed, sender=Locacao.brinquedos.through)
+def versao_locacoes(sender, instance, **kwargs):
+    # No m2m_changed só interessa o "post_" de cada ação
+    if kwargs.get('action', 'post_').startswith('post_'):
+        incrementar_versao(instance.organization_id, 'locacoes')
+        invalidar_dashboard(instance.organization_id)
+
+
+@receiver(post_save, sender=Transacoes)
+@receiver(pre_delete, sender=Transacoes)
+def versao_transacoes(sender, instance, **kwargs):
+    incrementar_versao(instance.organization_id, 'transacoes')
+    invalidar_dashboard(instance.organization_id)
+
+
+# Invalida o cache de autenticação quando token, usuário, profile ou
+# organização mudam
+@receiver(post_delete, sender=Token)
+def invalidar_cache_token(sender, instance, **kwargs):
+    cache_tokens.invalidar_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidar_cache_usuario(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    cache_tokens.invalidar_usuario(user_id)
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def invalidar_cache_organizacao(sender, instance, **kwargs):
+    cache_tokens.invalidar_organizacao(instance.pk)
+
+
+# Manutenção incremental da tabela OcupacaoDiaria: só os brinquedos e os
+# dias tocados pela alteração são recalculados
+def recalcular_periodos(organization_id, brinquedos, periodos):
+    for inicio, fim in set(periodos):
+        if inicio and fim:
+            recalcular_ocupacao(organization_id, brinquedos, inicio, fim)
+
+
+@receiver(post_init, sender=Locacao)
+def guardar_datas_locacao(sender, instance, **kwargs):
+    # __dict__ para não disparar query em campos adiados (.only())
+    instance._datas_salvas = (
+        instance.__dict__.get('data_festa'),
+        instance.__dict__.get('data_desmontagem'),
     )
-    for t in transacoes:
-        t.pagamento = "cancelado"
-        t.descricao += " (Cancelada junto com o brinquedo)"
-        t.save(update_fields=["pagamento", "descricao"])
+
+
+@receiver(post_save, sender=Locacao)
+def atualizar_ocupacao_locacao(sender, instance, created, **kwargs):
+    antes = instance._datas_salvas
+    depois = (instance.data_festa, instance.data_desmontagem)
+    instance._datas_salvas = depois
+
+    # Locação nova ainda não tem brinquedos (entram via m2m_changed)
+    if created or antes == depois:
+        return
+    brinquedos = list(instance.brinquedos.values_list('id', flat=True))
+    recalcular_periodos(instance.organization_id, brinquedos, [antes, depois])
+
+
+@receiver(m2m_changed, sender=Locacao.brinquedos.through)
+def atualizar_ocupacao_brinquedos(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    ids = relacionados_alterados(instance, action, pk_set)
+    if not reverse:
+        recalcular_periodos(instance.organization_id, ids, [
+            (instance.data_festa, instance.data_desmontagem)])
+    else:
+        for organization_id, inicio, fim in Locacao.objects.filter(id__in=ids).values_list(
+                'organization_id', 'data_festa', 'data_desmontagem'):
+            recalcular_ocupacao(organization_id, [instance.id], inicio, fim)
+
+
+@receiver(pre_delete, sender=Locacao)
+def guardar_brinquedos_locacao(sender, instance, **kwargs):
+    instance._brinquedos_antes = list(
+        instance.brinquedos.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Locacao)
+def atualizar_ocupacao_locacao_excluida(sender, instance, **kwargs):
+    recalcular_periodos(instance.organization_id, instance._brinquedos_antes, [
+        (instance.data_festa, instance.data_desmontagem)])
+
+
+# Manutenção incremental de ResumoFinanceiroMensal: só os meses tocados
+# pela alteração são reagregados
+CAMPOS_RESUMO = ('organization_id', 'data_transacao',
+                 'tipo', 'categoria', 'pagamento', 'valor')
+
+
+@receiver(post_init, sender=Transacoes)
+def guardar_valores_transacao(sender, instance, **kwargs):
+    instance._resumo_salvo = tuple(
+        instance.__dict__.get(campo) for campo in CAMPOS_RESUMO)
+
+
+@receiver(post_save, sender=Transacoes)
+def atualizar_resumo_transacao(sender, instance, created, **kwargs):
+    antes = instance._resumo_salvo
+    depois = tuple(instance.__dict__.get(campo) for campo in CAMPOS_RESUMO)
+    instance._resumo_salvo = depois
+
+    if not created and antes == depois:
+        return
+    recalcular_resumo([(antes[0], antes[1]), (depois[0], depois[1])])
+
+
+def transacoes_gravadas_em_lote(organization_id, datas):
+    """
+    Efeitos colaterais de transações gravadas sem passar pelos signals
+    (bulk_create, bulk_update, update): resumo dos meses tocados, versão
+    do recurso e cache do dashboard, uma vez para o lote inteiro.
+    """
+    recalcular_resumo([(organization_id, data) for data in datas])
+    incrementar_versao(organization_id, 'transacoes')
+    invalidar_dashboard(organization_id)
+
+
+@receiver(post_delete, sender=Transacoes)
+def atualizar_resumo_transacao_excluida(sender, instance, **kwargs):
+    recalcular_resumo(
+        [(instance.organization_id, instance.data_transacao)])
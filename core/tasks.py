@@ -1,26 +1,40 @@
 from background_task import background
-from datetime import datetime
-from django.utils.timezone import make_aware
+from django.db import connection, transaction
+from django.utils import timezone
 
 
 @background(schedule=60)
 def verificar_festas_do_dia():
     from .models import Locacao  # seu model de festas
+    from .dashboard import invalidar_dashboard
+    from .versioning import incrementar_versao
 
-    agora = make_aware(datetime.now())
-    festas_hoje = Locacao.objects.filter(data_festa=agora.date())
+    # Data e hora locais (TIME_ZONE), no mesmo formato dos campos da festa
+    agora = timezone.localtime()
 
-    print(f"Festas de hoje: {festas_hoje.count()}")
+    # Festas montadas cuja desmontagem já passou: o filtro roda no banco e
+    # usa o índice (status, data_desmontagem)
+    encerradas = Locacao.objects.filter(
+        status='montado', data_desmontagem__lte=agora.date(),
+    ).exclude(
+        data_desmontagem=agora.date(), hora_desmontagem__gt=agora.time(),
+    )
 
-    # Agora vamos atualizar os status que precisam mudar
-    festas_montadas = Locacao.objects.filter(status='montado')
+    # Um único UPDATE (sem carregar nem salvar cada festa) que devolve as
+    # festas alteradas
+    sql, params = encerradas.values('pk').query.sql_with_params()
+    tabela = Locacao._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {tabela} SET status = %s WHERE id IN ({sql}) '
+            f'RETURNING id, organization_id', ('recolher', *params))
+        atualizadas = cursor.fetchall()
 
-    for festa in festas_montadas:
-        dt_desmontagem = datetime.combine(
-            festa.data_desmontagem, festa.hora_desmontagem)
-        dt_desmontagem = make_aware(dt_desmontagem)  # torna timezone-aware
+        # O UPDATE não dispara os signals: versão e dashboard por organização
+        for organization_id in {org for _id, org in atualizadas}:
+            incrementar_versao(organization_id, 'locacoes')
+            invalidar_dashboard(organization_id)
 
-        if agora >= dt_desmontagem:
-            festa.status = 'recolher'
-            festa.save()
-            print(f"Status da festa {festa.id} atualizado para 'recolher'")
+    if atualizadas:
+        ids = sorted(festa_id for festa_id, _org in atualizadas)
+        print(f"Status das festas {ids} atualizado para 'recolher'")
@@ -1,3 +1,262 @@
-from django.test import TestCase
+import threading
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from .management.commands.benchmark import Command as Benchmark
+from .models import Brinquedo, Cliente, Locacao, Organization, Profile, Transacoes, VersaoRecurso
+from .serializers import LocacaoSerializer
+from .versioning import _incrementar_agora
+
+
+def criar_organizacao(username='teste'):
+    user = User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='senha-teste')
+    org = Organization.objects.create(name=f'Org {username}', owner=user)
+    Profile.objects.update_or_create(
+        user=user, defaults={'organization': org, 'role': 'admin'})
+    client = APIClient()
+    client.force_authenticate(user=User.objects.get(pk=user.pk))
+    return org, client
+
+
+def criar_cliente(org):
+    return Cliente.objects.create(
+        organization=org, nome='Cliente Teste', documento='000', telefone='000',
+        cep='00000-000', endereco='Rua', cidade='Cidade', uf='SP')
+
+
+def criar_brinquedo(org, **campos):
+    dados = dict(organization=org, nome='Pula-pula', valor_diaria=Decimal('100.00'),
+                 qtd_total=1, qtd_disponivel=1, tamanho='3x3')
+    dados.update(campos)
+    return Brinquedo.objects.create(**dados)
+
+
+def criar_locacao(org, cliente, brinquedos, dia=date(2026, 1, 10)):
+    locacao = Locacao.objects.create(
+        organization=org, cliente=cliente, data_festa=dia, hora_festa=time(14),
+        hora_montagem=time(12), data_desmontagem=dia, hora_desmontagem=time(20),
+        montador='Equipe', qtd_parcelas=1, cep='00000-000', endereco='Rua',
+        cidade='Cidade', uf='SP')
+    locacao.brinquedos.set(brinquedos)
+    return locacao
+
+
+def reservar(org, cliente, brinquedos, dia=date(2026, 1, 10), **campos):
+    """Cria a locação pelo serializer, como o POST de /api/locacoes/."""
+    dados = {
+        'cliente': cliente.id, 'brinquedos_ids': [b.id for b in brinquedos],
+        'data_festa': dia, 'hora_festa': '14:00', 'hora_montagem': '12:00',
+        'data_desmontagem': dia, 'hora_desmontagem': '20:00', 'montador': 'Equipe',
+        'qtd_parcelas': 1, 'cep': '00000-000', 'endereco': 'Rua',
+        'cidade': 'Cidade', 'uf': 'SP',
+    }
+    dados.update(campos)
+    serializer = LocacaoSerializer(data=dados)
+    serializer.is_valid(raise_exception=True)
+    return serializer.save(organization=org)
+
+
+class ListagemLocacoesTest(TestCase):
+    """A listagem de locações faz um número fixo de queries (sem N+1)."""
+
+    def setUp(self):
+        self.org, self.client = criar_organizacao()
+        self.cliente = criar_cliente(self.org)
+        self.brinquedos = [
+            criar_brinquedo(self.org, nome='Pula-pula', qtd_total=50),
+            criar_brinquedo(self.org, nome='Tobogã', valor_diaria=Decimal('55.50'), qtd_total=50),
+        ]
+
+    def test_queries_nao_crescem_com_as_locacoes(self):
+        criar_locacao(self.org, self.cliente, self.brinquedos)
+        self.client.get('/api/locacoes/')  # Aquece o cache de autenticação
+        with CaptureQueriesContext(connection) as uma_locacao:
+            resposta = self.client.get('/api/locacoes/')
+        self.assertEqual(len(resposta.data), 1)
+
+        for _ in range(9):
+            criar_locacao(self.org, self.cliente, self.brinquedos)
+        with self.assertNumQueries(len(uma_locacao)):
+            resposta = self.client.get('/api/locacoes/')
+
+        self.assertEqual(len(resposta.data), 10)
+        self.assertEqual(len(resposta.data[0]['brinquedos']), 2)
+        self.assertEqual(
+            Decimal(resposta.data[0]['valor_total_calculado']), Decimal('155.50'))
+
+
+class GetCondicionalTest(TestCase):
+    """ETag / Last-Modified dos GETs com @condicional."""
+
+    def setUp(self):
+        self.org, self.client = criar_organizacao()
+
+    def versao(self, atualizado_em):
+        # update() para não passar pelo auto_now do campo
+        VersaoRecurso.objects.get_or_create(organization=self.org, recurso='clientes')
+        VersaoRecurso.objects.filter(organization=self.org, recurso='clientes').update(
+            atualizado_em=atualizado_em)
+
+    def test_if_modified_since_no_segundo_da_mudanca_nao_da_304(self):
+        agora = timezone.now()
+        self.versao(agora)
+        resposta = self.client.get('/api/clientes/')
+        self.assertNotIn('Last-Modified', resposta)
+
+        resposta = self.client.get(
+            '/api/clientes/', HTTP_IF_MODIFIED_SINCE=http_date(agora.timestamp()))
+        self.assertEqual(resposta.status_code, 200)
+
+    def test_if_modified_since_de_segundo_encerrado(self):
+        self.versao(timezone.now() - timedelta(seconds=10))
+        resposta = self.client.get('/api/clientes/')
+        resposta = self.client.get(
+            '/api/clientes/', HTTP_IF_MODIFIED_SINCE=resposta['Last-Modified'])
+        self.assertEqual(resposta.status_code, 304)
+
+    def test_if_none_match_tem_precedencia(self):
+        self.versao(timezone.now() - timedelta(seconds=10))
+        resposta = self.client.get('/api/clientes/')
+        etag, last_modified = resposta['ETag'], resposta['Last-Modified']
+
+        # ETag diferente: 200 mesmo com a data batendo
+        resposta = self.client.get(
+            '/api/clientes/', HTTP_IF_NONE_MATCH='"outro"',
+            HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resposta.status_code, 200)
+
+        resposta = self.client.get('/api/clientes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+
+
+class IncrementarVersaoTest(TestCase):
+    """Cada commit incrementa a versão dos recursos uma vez, inclusive o primeiro."""
+
+    def setUp(self):
+        self.org, _client = criar_organizacao()
+
+    def versoes(self):
+        return dict(VersaoRecurso.objects.filter(
+            organization=self.org).values_list('recurso', 'versao'))
+
+    def test_primeira_escrita(self):
+        _incrementar_agora(self.org.id, ['clientes', 'brinquedos'])
+        self.assertEqual(self.versoes(), {'clientes': 1, 'brinquedos': 1})
+
+    def test_linha_criada_por_commit_concorrente(self):
+        update = QuerySet.update
+        concorrente = []
+
+        def update_com_commit_concorrente(queryset, **campos):
+            if not concorrente:
+                # O update não achou a linha; outro commit a cria logo depois
+                concorrente.append(VersaoRecurso.objects.create(
+                    organization=self.org, recurso='locacoes', versao=1))
+                return 0
+            return update(queryset, **campos)
+
+        with mock.patch.object(QuerySet, 'update', update_com_commit_concorrente):
+            _incrementar_agora(self.org.id, ['locacoes'])
+        self.assertEqual(self.versoes(), {'locacoes': 2})
+
+
+class GravacaoLocacaoTest(TestCase):
+    """
+    Criar e trocar brinquedos de uma locação cabe no orçamento de queries do
+    benchmark, com valores e parcelas gravados na mesma transação.
+    """
+
+    def setUp(self):
+        self.org, _client = criar_organizacao()
+        self.cliente = criar_cliente(self.org)
+        self.brinquedos = [criar_brinquedo(
+            self.org, nome=f'Brinquedo {i}', valor_diaria=Decimal(100 + i),
+            qtd_total=10) for i in range(6)]
+
+    def assertValores(self, locacao, esperado):
+        locacao.refresh_from_db()
+        self.assertEqual(locacao.valor_total, esperado)
+        parcelas = Transacoes.objects.filter(locacao=locacao)
+        self.assertEqual(parcelas.count(), 12)
+        # Cada parcela é arredondada: a soma pode sobrar alguns centavos
+        self.assertAlmostEqual(
+            sum(p.valor for p in parcelas), esperado, delta=Decimal('0.12'))
+
+    def test_criar_e_trocar_brinquedos(self):
+        with CaptureQueriesContext(connection) as criar:
+            locacao = reservar(self.org, self.cliente, self.brinquedos[:3],
+                               qtd_parcelas=12, acrescimos='50.00')
+        self.assertLessEqual(len(criar), Benchmark.orcamento_locacoes['criar'])
+        self.assertValores(locacao, Decimal('353.00'))
+
+        serializer = LocacaoSerializer(locacao, data={
+            'brinquedos_ids': [b.id for b in self.brinquedos[3:]]}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as editar:
+            serializer.save()
+        self.assertLessEqual(len(editar), Benchmark.orcamento_locacoes['editar'])
+        self.assertValores(locacao, Decimal('362.00'))
+
+
+class ReservaSemOverbookingTest(TestCase):
+    """Uma reserva só é aceita se sobrar unidade do brinquedo no período."""
+
+    def setUp(self):
+        self.org, _client = criar_organizacao()
+        self.cliente = criar_cliente(self.org)
+        self.brinquedo = criar_brinquedo(self.org, qtd_total=2)
+
+    def test_recusa_reserva_alem_das_unidades(self):
+        reservar(self.org, self.cliente, [self.brinquedo])
+        reservar(self.org, self.cliente, [self.brinquedo])
+        with self.assertRaises(ValidationError):
+            reservar(self.org, self.cliente, [self.brinquedo])
+        # Outro dia continua livre
+        reservar(self.org, self.cliente, [self.brinquedo], dia=date(2026, 1, 11))
+        self.assertEqual(Locacao.objects.filter(data_festa=date(2026, 1, 10)).count(), 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Precisa de SELECT ... FOR UPDATE (PostgreSQL)')
+class ReservaConcorrenteTest(TransactionTestCase):
+    """Reservas simultâneas do mesmo brinquedo não passam das unidades."""
+
+    def test_reservas_simultaneas(self):
+        org, _client = criar_organizacao()
+        cliente = criar_cliente(org)
+        brinquedo = criar_brinquedo(org, qtd_total=2)
+        aceitas, recusadas, erros = [], [], []
+        largada = threading.Barrier(8)
+
+        def tentar():
+            try:
+                largada.wait()
+                reservar(org, cliente, [brinquedo])
+                aceitas.append(1)
+            except ValidationError:
+                recusadas.append(1)
+            except Exception as exc:
+                erros.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tentar) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(erros, [])
+        self.assertEqual((len(aceitas), len(recusadas)), (2, 6))
+        self.assertEqual(Locacao.objects.filter(brinquedos=brinquedo).count(), 2)
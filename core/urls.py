@@ -10,6 +10,7 @@ from .views import (
     LocacoesDetailAPIView,
     LocacoesStatusUpdateAPIView,
     BrinquedosDisponiveisAPIView,
+    BrinquedosCalendarioAPIView,
     ContratoLocacaoPDFView,
     ContratoAnexoAPIView,
     TransacoesListCreateAPIView,
@@ -43,6 +44,10 @@ urlpatterns = [
     path('brinquedos/disponiveis/', BrinquedosDisponiveisAPIView.as_view(),
          name='brinquedos-disponiveis'),
 
+    # Ocupação de cada brinquedo, dia a dia, em uma janela de datas
+    path('brinquedos/calendario/', BrinquedosCalendarioAPIView.as_view(),
+         name='brinquedos-calendario'),
+
     # Lista todas as locações ou cria uma nova
     path('locacoes/', LocacoesListCreateAPIView.as_view(),
          name='locacoes-list-create'),
@@ -0,0 +1,92 @@
+import hashlib
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import VersaoRecurso
+
+
+def incrementar_versao(organization_id, *recursos):
+    """
+    Incrementa a versão dos recursos da organização assim que a transação
+    atual for confirmada (um leitor nunca vê a versão nova com dados antigos).
+    """
+    if not organization_id:
+        return
+    transaction.on_commit(
+        lambda: _incrementar_agora(organization_id, recursos))
+
+
+def _incrementar_agora(organization_id, recursos):
+    agora = timezone.now()
+    for recurso in recursos:
+        versoes = VersaoRecurso.objects.filter(
+            organization_id=organization_id, recurso=recurso)
+        if versoes.update(versao=F('versao') + 1, atualizado_em=agora):
+            continue
+
+        # Primeira escrita do recurso: cria a linha zerada (ou mantém a que
+        # um commit concorrente acabou de criar) e incrementa em seguida, para
+        # não perder nenhum dos dois incrementos
+        try:
+            VersaoRecurso.objects.bulk_create(
+                [VersaoRecurso(organization_id=organization_id, recurso=recurso)],
+                ignore_conflicts=True)
+        except IntegrityError:
+            # A organização foi excluída na mesma transação
+            continue
+        versoes.update(versao=F('versao') + 1, atualizado_em=agora)
+
+
+def condicional(*recursos):
+    """
+    Decorator para o GET de uma APIView: responde 304 a If-None-Match /
+    If-Modified-Since consultando só a tabela de versões, sem rodar a
+    consulta principal nem a serialização.
+    """
+    def decorator(metodo):
+        @wraps(metodo)
+        def wrapper(view, request, *args, **kwargs):
+            org_id = request.user.profile.organization_id
+            versoes = {v.recurso: v for v in VersaoRecurso.objects.filter(
+                organization_id=org_id, recurso__in=recursos)}
+
+            assinatura = ';'.join(
+                f'{r}={versoes[r].versao if r in versoes else 0}' for r in recursos)
+            digest = hashlib.md5(
+                f'{org_id}|{request.get_full_path()}|{assinatura}'.encode('utf-8')
+            ).hexdigest()
+            etag = f'"{digest}"'
+            last_modified = None
+            if versoes:
+                last_modified = int(max(
+                    v.atualizado_em for v in versoes.values()).timestamp())
+            # Last-Modified tem resolução de segundos e a versão pode mudar de
+            # novo dentro do mesmo segundo: só vale como validador (enviado
+            # ou comparado) depois que o segundo da última mudança passou
+            if last_modified is not None and last_modified >= int(timezone.now().timestamp()):
+                last_modified = None
+
+            # Com If-None-Match só o ETag decide; If-Modified-Since sozinho
+            # usa a data
+            resposta = get_conditional_response(
+                request, etag=etag,
+                last_modified=None if 'HTTP_IF_NONE_MATCH' in request.META else last_modified)
+            if resposta is None:
+                resposta = metodo(view, request, *args, **kwargs)
+                if resposta.status_code != 200:
+                    return resposta
+
+            resposta['ETag'] = etag
+            if last_modified:
+                resposta['Last-Modified'] = http_date(last_modified)
+            # Força o navegador a revalidar sempre (e só por usuário)
+            patch_cache_control(resposta, private=True, no_cache=True)
+            patch_vary_headers(resposta, ['Authorization'])
+            return resposta
+        return wrapper
+    return decorator
@@ -8,21 +8,39 @@ from rest_framework import status
 from rest_framework.parsers import MultiPartParser
 from .models import Cliente, Brinquedo, Locacao, ContratoAnexo, Transacoes
 from .serializers import ClienteSerializer, BrinquedoSerializer, LocacaoSerializer, ContratoAnexoSerializer, TransacoesSerializer
+from .pagination import TransacoesCursorPagination
+from .versioning import condicional
+from .authentication import cache_tokens
+from .availability import disponibilidade, ocupacao_por_dia, run_length, unidades_do_brinquedo
+from .dashboard import SECOES, dashboard_em_cache, periodo_em_meses
 from xhtml2pdf import pisa
 from decimal import Decimal
 from datetime import datetime, date
 from django.utils.text import slugify
 from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from django.db.models import Sum, Count, F, Q, DecimalField, CharField
-from django.db.models.functions import Coalesce, TruncMonth
+from django.db import transaction
+from django.db.models.functions import Lower
 from dateutil.relativedelta import relativedelta
 
 User = get_user_model()
 
 
+def campos_da_requisicao(request):
+    """
+    Lê ?fields= e ?expand= (listas separadas por vírgula) no formato
+    aceito pelos serializers com CamposDinamicosMixin.
+    """
+    fields = request.GET.get('fields')
+    expand = request.GET.get('expand')
+    return {
+        'fields': fields.split(',') if fields else None,
+        'expand': expand.split(',') if expand else None,
+    }
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def LoginCreateAPIView(request):
@@ -32,32 +50,41 @@ def LoginCreateAPIView(request):
     if not email or not password:
         return Response({'error': 'Email e senha são obrigatórios'}, status=400)
 
-    try:
-        user = User.objects.get(email=email)
-    except User.DoesNotExist:
+    # Uma única query: usuário (pelo índice em LOWER(email)) + profile,
+    # organização e token
+    user = User.objects.select_related('profile__organization', 'auth_token').annotate(
+        email_normalizado=Lower('email')
+    ).filter(email_normalizado=email.strip().lower()).order_by('id').first()
+
+    if user is None or not user.is_active or not user.check_password(password):
         return Response({'error': 'Usuário ou senha inválidos'}, status=401)
 
-    user = authenticate(username=user.username, password=password)
-    if user:
+    try:
+        token = user.auth_token
+    except Token.DoesNotExist:
         token, created = Token.objects.get_or_create(user=user)
-        # pega a organização do profile do usuário
-        organization_id = user.profile.organization.id
-        return Response({
-            'token': token.key,
-            'organization_id': organization_id
-        })
 
-    return Response({'error': 'Usuário ou senha inválidos'}, status=401)
+    # Já deixa o token no cache de autenticação para as próximas requisições
+    cache_tokens.guardar(token)
 
+    # pega a organização do profile do usuário
+    organization_id = user.profile.organization_id
+    return Response({
+        'token': token.key,
+        'organization_id': organization_id
+    })
 
 
 # Cliente API
 # Lista todos os clientes ou cria um novo
 class ClienteListCreateAPIView(APIView):
+    @condicional('clientes')
     def get(self, request):
         org = request.user.profile.organization
         clientes = Cliente.objects.filter(organization=org)
-        serializer = ClienteSerializer(clientes, many=True)
+        opcoes = campos_da_requisicao(request)
+        clientes = ClienteSerializer(**opcoes).otimizar_queryset(clientes)
+        serializer = ClienteSerializer(clientes, many=True, **opcoes)
         return Response(serializer.data)
 
     def post(self, request):
@@ -71,25 +98,29 @@ class ClienteListCreateAPIView(APIView):
 
 # Lista só os clientes com status "ativo"
 class ClientesAtivosAPIView(APIView):
+    @condicional('clientes')
     def get(self, request):
         org = request.user.profile.organization
         clientes = Cliente.objects.filter(status='ativo', organization=org)
-        serializer = ClienteSerializer(clientes, many=True)
+        opcoes = campos_da_requisicao(request)
+        clientes = ClienteSerializer(**opcoes).otimizar_queryset(clientes)
+        serializer = ClienteSerializer(clientes, many=True, **opcoes)
         return Response(serializer.data)
 
 
 # Detalhe, edição e exclusão de cliente específico
 class ClienteDetailAPIView(APIView):
+    @condicional('clientes')
     def get(self, request, id):
         cliente = get_object_or_404(
             Cliente, id=id, organization=request.user.profile.organization)
-        serializer = ClienteSerializer(cliente)
+        serializer = ClienteSerializer(
+            cliente, **campos_da_requisicao(request))
         return Response(serializer.data)
 
     def put(self, request, id):
         org = request.user.profile.organization
-        cliente = get_object_or_404(
-            Cliente, id=id, organization=request.user.profile.organization)
+        cliente = get_object_or_404(Cliente, id=id, organization=org)
         serializer = ClienteSerializer(cliente, data=request.data)
         if serializer.is_valid():
             serializer.save(organization=org)
@@ -106,10 +137,14 @@ class ClienteDetailAPIView(APIView):
 # Brinquedos
 # Lista todos os brinquedos ou cria um novo
 class BrinquedoListCreateAPIView(APIView):
+    @condicional('brinquedos')
     def get(self, request):
         org = request.user.profile.organization
         brinquedos = Brinquedo.objects.filter(organization=org)
-        serializer = BrinquedoSerializer(brinquedos, many=True)
+        opcoes = campos_da_requisicao(request)
+        brinquedos = BrinquedoSerializer(
+            **opcoes).otimizar_queryset(brinquedos)
+        serializer = BrinquedoSerializer(brinquedos, many=True, **opcoes)
         return Response(serializer.data)
 
     def post(self, request):
@@ -123,16 +158,17 @@ class BrinquedoListCreateAPIView(APIView):
 
 # Detalhe, edição e exclusão de brinquedo específico
 class BrinquedoDetailAPIView(APIView):
+    @condicional('brinquedos')
     def get(self, request, id):
         brinquedo = get_object_or_404(
             Brinquedo, id=id, organization=request.user.profile.organization)
-        serializer = BrinquedoSerializer(brinquedo)
+        serializer = BrinquedoSerializer(
+            brinquedo, **campos_da_requisicao(request))
         return Response(serializer.data)
 
     def put(self, request, id):
         org = request.user.profile.organization
-        brinquedo = get_object_or_404(
-            Brinquedo, id=id, organization=request.user.profile.organization)
+        brinquedo = get_object_or_404(Brinquedo, id=id, organization=org)
         serializer = BrinquedoSerializer(brinquedo, data=request.data)
         if serializer.is_valid():
             serializer.save(organization=org)
@@ -163,36 +199,76 @@ class BrinquedosDisponiveisAPIView(APIView):
         except ValueError:
             return Response({"erro": "Formato de data inválido."}, status=400)
 
-        # Busca os brinquedos que já estão locados nesse período
+        # Unidades livres de cada brinquedo no período (considera qtd_total)
         org = request.user.profile.organization
-        locacoes_conflitantes = Locacao.objects.filter(
+        livres = disponibilidade(org, data_festa, data_desmontagem)
+
+        brinquedos_disponiveis = Brinquedo.objects.filter(
             organization=org,
-            data_festa__lte=data_desmontagem,
-            data_desmontagem__gte=data_festa
-        ).prefetch_related('brinquedos')
+            id__in=[brinquedo_id for brinquedo_id, qtd in livres.items() if qtd > 0]
+        )
+        opcoes = campos_da_requisicao(request)
+        brinquedos_disponiveis = BrinquedoSerializer(
+            **opcoes).otimizar_queryset(brinquedos_disponiveis)
+        serializer = BrinquedoSerializer(
+            brinquedos_disponiveis, many=True, **opcoes)
+
+        data = serializer.data
+        for item in data:
+            item['qtd_livre'] = livres[item['id']]
+        return Response(data)
 
-        # Coleta os IDs dos brinquedos já locados
-        ids_indisponiveis = set()
-        for loc in locacoes_conflitantes:
-            ids_indisponiveis.update(
-                loc.brinquedos.values_list('id', flat=True))
 
-        # Filtra brinquedos que NÃO estão nesses IDs
-        brinquedos_disponiveis = Brinquedo.objects.filter(
-            organization=org
-        ).exclude(id__in=ids_indisponiveis)
-        serializer = BrinquedoSerializer(brinquedos_disponiveis, many=True)
-        return Response(serializer.data)
+# Calendário de ocupação dos brinquedos (brinquedo × dia) em uma janela
+class BrinquedosCalendarioAPIView(APIView):
+    max_dias = 366
+
+    @condicional('locacoes', 'brinquedos')
+    def get(self, request):
+        try:
+            inicio = datetime.strptime(
+                request.GET.get('inicio', ''), "%Y-%m-%d").date()
+            fim = datetime.strptime(
+                request.GET.get('fim', ''), "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"erro": "Informe inicio e fim no formato YYYY-MM-DD."}, status=400)
+
+        if fim < inicio:
+            return Response({"erro": "A data final não pode ser anterior à inicial."}, status=400)
+        dias = (fim - inicio).days + 1
+        if dias > self.max_dias:
+            return Response({"erro": f"A janela pode ter no máximo {self.max_dias} dias."}, status=400)
+
+        org = request.user.profile.organization
+        ocupacao = ocupacao_por_dia(org, inicio, fim)
+        brinquedos = Brinquedo.objects.filter(
+            organization=org).order_by('nome').values_list('id', 'nome', 'qtd_total')
+
+        # "ocupacao" vem em run-length: [[unidades reservadas, dias], ...]
+        return Response({
+            'inicio': inicio,
+            'fim': fim,
+            'dias': dias,
+            'brinquedos': [{
+                'id': brinquedo_id,
+                'nome': nome,
+                'qtd_total': unidades_do_brinquedo(qtd_total),
+                'ocupacao': run_length(ocupacao.get(brinquedo_id, [0] * dias)),
+            } for brinquedo_id, nome, qtd_total in brinquedos],
+        })
 
 
 # Locações
 # Lista todas as locações ou cria uma nova
 class LocacoesListCreateAPIView(APIView):
+    @condicional('locacoes', 'brinquedos')
     def get(self, request):
         org = request.user.profile.organization
         locacoes = Locacao.objects.filter(
-            organization=org).order_by('data_festa')
-        serializer = LocacaoSerializer(locacoes, many=True)
+            organization=org).para_listagem().order_by('data_festa')
+        opcoes = campos_da_requisicao(request)
+        locacoes = LocacaoSerializer(**opcoes).otimizar_queryset(locacoes)
+        serializer = LocacaoSerializer(locacoes, many=True, **opcoes)
         return Response(serializer.data)
 
     def post(self, request):
@@ -234,11 +310,13 @@ class LocacoesDetailAPIView(APIView):
         except Locacao.DoesNotExist:
             return None
 
+    @condicional('locacoes', 'brinquedos')
     def get(self, request, id):
         locacao = self.get_object(id)
         if not locacao:
             return Response({'erro': 'Locação não encontrada'}, status=404)
-        serializer = LocacaoSerializer(locacao)
+        serializer = LocacaoSerializer(
+            locacao, **campos_da_requisicao(request))
         return Response(serializer.data)
 
     def put(self, request, id):
@@ -285,20 +363,7 @@ class LocacoesDetailAPIView(APIView):
         if not locacao:
             return Response({'erro': 'Locação não encontrada'}, status=404)
 
-        # Aqui é o lugar certo para cancelar a transação automática
-        transacao = Transacoes.objects.filter(
-            locacao=locacao,
-            origem='locacao'
-        ).first()
-        if transacao:
-            # Opção 1: marcar como cancelado
-            transacao.status = 'cancelado'
-            transacao.descricao += " (Cancelada junto com a locação)"
-            transacao.save()
-
-            # Opção 2 (menos recomendada): deletar a transação
-            # transacao.delete()
-
+        # As transações da locação são canceladas pelo signal de pre_delete
         # Deleta a locação
         locacao.delete()
         return Response(status=204)
@@ -417,12 +482,41 @@ class ContratoAnexoAPIView(APIView):
 
 # Transações
 class TransacoesListCreateAPIView(APIView):
+    # Filtros aceitos na listagem (aceitam vários valores separados por vírgula)
+    filtros_por_valor = ['tipo', 'categoria', 'pagamento', 'origem']
+
+    @condicional('transacoes', 'brinquedos')
     def get(self, request):
         org = request.user.profile.organization
-        transacoes = Transacoes.objects.filter(
-            organization=org).order_by('-data_transacao')
-        serializer = TransacoesSerializer(transacoes, many=True)
-        return Response(serializer.data)
+        opcoes = campos_da_requisicao(request)
+        transacoes = Transacoes.objects.filter(organization=org)
+        # data_transacao é sempre necessária para montar o cursor
+        transacoes = TransacoesSerializer(
+            **opcoes).otimizar_queryset(transacoes, 'data_transacao')
+
+        # Intervalo de datas (YYYY-MM-DD), aplicado direto no SQL
+        try:
+            data_inicio = request.GET.get('data_inicio')
+            if data_inicio:
+                transacoes = transacoes.filter(
+                    data_transacao__gte=datetime.strptime(data_inicio, "%Y-%m-%d").date())
+            data_fim = request.GET.get('data_fim')
+            if data_fim:
+                transacoes = transacoes.filter(
+                    data_transacao__lte=datetime.strptime(data_fim, "%Y-%m-%d").date())
+        except ValueError:
+            return Response({"erro": "Formato de data inválido."}, status=400)
+
+        for campo in self.filtros_por_valor:
+            valor = request.GET.get(campo)
+            if valor:
+                transacoes = transacoes.filter(
+                    **{f'{campo}__in': valor.split(',')})
+
+        paginator = TransacoesCursorPagination()
+        pagina = paginator.paginate_queryset(transacoes, request, view=self)
+        serializer = TransacoesSerializer(pagina, many=True, **opcoes)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         data = request.data.copy()
@@ -431,35 +525,40 @@ class TransacoesListCreateAPIView(APIView):
         serializer = TransacoesSerializer(data=data)
 
         if serializer.is_valid():
-            serializer.save()
+            # A primeira parcela e as demais (criar_parcelas_manuais) são
+            # gravadas juntas: nunca fica um parcelamento pela metade
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class TransacoesDetailAPIView(APIView):
+    @condicional('transacoes', 'brinquedos')
     def get(self, request, id):
         transacao = get_object_or_404(
             Transacoes, id=id, organization=request.user.profile.organization)
-        serializer = TransacoesSerializer(transacao)
+        serializer = TransacoesSerializer(
+            transacao, **campos_da_requisicao(request))
         return Response(serializer.data)
     
     def patch(self, request, id):
-        transacao = get_object_or_404(
-            Transacoes, id=id, organization=request.user.profile.organization)
+        org = request.user.profile.organization
+        transacao = get_object_or_404(Transacoes, id=id, organization=org)
         
         serializer = TransacoesSerializer(
             transacao, data=request.data, partial=True)
 
         if serializer.is_valid():
-            serializer.save(organization=request.user.profile.organization)
+            serializer.save(organization=org)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request, id):
-        transacao = get_object_or_404(
-            Transacoes, id=id, organization=request.user.profile.organization)
+        org = request.user.profile.organization
+        transacao = get_object_or_404(Transacoes, id=id, organization=org)
         serializer = TransacoesSerializer(transacao, data=request.data)
         if serializer.is_valid():
-            serializer.save(organization=request.user.profile.organization)
+            serializer.save(organization=org)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -475,152 +574,44 @@ class DashboardAPIView(APIView):
     necessárias para o dashboard.
     """
     permission_classes = [IsAuthenticated]
+    max_meses = 120
 
     def get(self, request, *args, **kwargs):
-        org = request.user.profile.organization
+        """
+        ?secoes=stat_cards,chart_receita_despesa  só as seções pedidas
+        ?meses=12  ou  ?inicio=YYYY-MM-DD&fim=YYYY-MM-DD  janela dos gráficos
+        (alinhada a meses inteiros)
+        """
+        secoes = None
+        if request.GET.get('secoes'):
+            secoes = [s.strip() for s in request.GET['secoes'].split(',') if s.strip()]
+            invalidas = [s for s in secoes if s not in SECOES]
+            if invalidas:
+                return Response({"erro": f"Seções inválidas: {', '.join(invalidas)}. "
+                                 f"Disponíveis: {', '.join(SECOES)}."}, status=400)
+
+        periodo = None
         hoje = date.today()
+        if request.GET.get('meses'):
+            try:
+                meses = int(request.GET['meses'])
+            except ValueError:
+                meses = 0
+            if not 1 <= meses <= self.max_meses:
+                return Response({"erro": f"meses deve ser um número entre 1 e {self.max_meses}."}, status=400)
+            periodo = periodo_em_meses(
+                hoje - relativedelta(months=meses - 1), hoje)
+        elif request.GET.get('inicio') or request.GET.get('fim'):
+            try:
+                inicio = datetime.strptime(
+                    request.GET.get('inicio', '1900-01-01'), "%Y-%m-%d").date()
+                fim = datetime.strptime(
+                    request.GET.get('fim', hoje.isoformat()), "%Y-%m-%d").date()
+            except ValueError:
+                return Response({"erro": "Informe inicio e fim no formato YYYY-MM-DD."}, status=400)
+            if fim < inicio:
+                return Response({"erro": "A data final não pode ser anterior à inicial."}, status=400)
+            periodo = periodo_em_meses(inicio, fim)
 
-        # --- SEÇÃO 1: CÁLCULOS GERAIS PARA OS STAT CARDS ---
-        investimento_total = Brinquedo.objects.filter(organization=org).aggregate(
-            total=Coalesce(Sum('valor_compra'), Decimal(
-                '0.00'), output_field=DecimalField())
-        )['total']
-
-        receita_acumulada = Transacoes.objects.filter(
-            organization=org, tipo='entrada', pagamento__in=['pago', 'entrada']
-        ).aggregate(
-            total=Coalesce(Sum('valor'), Decimal('0.00'),
-                           output_field=DecimalField())
-        )['total']
-
-        despesa_total = Transacoes.objects.filter(
-            organization=org, tipo='saida', pagamento='pago'
-        ).aggregate(
-            total=Coalesce(Sum('valor'), Decimal('0.00'),
-                           output_field=DecimalField())
-        )['total']
-
-        roi_global = Decimal('0.00')
-        if investimento_total > 0:
-            lucro = receita_acumulada - despesa_total
-            roi_global = (lucro / investimento_total) * 100
-
-        # --- SEÇÃO 2: CÁLCULOS POR BRINQUEDO (PARA AS DUAS TABELAS) ---
-        roi_por_brinquedo = []
-        previsao_break_even = []  # Lista para a segunda tabela
-
-        brinquedos = Brinquedo.objects.filter(organization=org)
-        for brinquedo in brinquedos:
-            # --- Bloco de cálculo para ROI ---
-            receita_brinquedo = Transacoes.objects.filter(
-                locacao__brinquedos=brinquedo, tipo='entrada', pagamento__in=['pago', 'entrada']
-            ).aggregate(total=Coalesce(Sum('valor'), Decimal('0.00')))['total']
-
-            manutencao_brinquedo = Transacoes.objects.filter(
-                brinquedo=brinquedo, tipo='saida', categoria='manutencao', pagamento='pago'
-            ).aggregate(total=Coalesce(Sum('valor'), Decimal('0.00')))['total']
-
-            investimento = brinquedo.valor_compra or Decimal('0.00')
-            custo_total_brinquedo = investimento + manutencao_brinquedo
-
-            roi_brinquedo = Decimal('0.00')
-            if custo_total_brinquedo > 0:
-                lucro_brinquedo = receita_brinquedo - custo_total_brinquedo
-                roi_brinquedo = (lucro_brinquedo / custo_total_brinquedo) * 100
-
-            roi_por_brinquedo.append({
-                'id': brinquedo.id, 'nome': brinquedo.nome, 'valor_compra': investimento,
-                'manutencao_acumulada': manutencao_brinquedo, 'receita_acumulada': receita_brinquedo,
-                'roi_percentual': roi_brinquedo, 'status': brinquedo.get_status_display(),
-            })
-
-            # --- Bloco de cálculo para BREAK-EVEN ---
-            primeira_locacao = Locacao.objects.filter(
-                brinquedos=brinquedo).order_by('data_festa').first()
-            receita_mensal_media = Decimal('0.00')
-            if primeira_locacao:
-                meses_operacao = (hoje.year - primeira_locacao.data_festa.year) * \
-                    12 + hoje.month - primeira_locacao.data_festa.month + 1
-                if meses_operacao > 0:
-                    receita_mensal_media = receita_brinquedo / meses_operacao
-
-            previsao_payback_str = "N/A"
-            if custo_total_brinquedo > receita_brinquedo:
-                if receita_mensal_media > 0:
-                    valor_faltante = custo_total_brinquedo - receita_brinquedo
-                    meses_faltantes = valor_faltante / receita_mensal_media
-                    previsao_payback_str = f"{meses_faltantes:.1f} meses"
-                else:
-                    previsao_payback_str = "Nunca (sem receita)"
-            else:
-                previsao_payback_str = "Já pago"
-
-            previsao_break_even.append({
-                'id': brinquedo.id, 'nome': brinquedo.nome, 'investimento_total': custo_total_brinquedo,
-                'receita_mensal_media': receita_mensal_media, 'receita_acumulada_atual': receita_brinquedo,
-                'previsao_payback': previsao_payback_str,
-            })
-
-        # --- SEÇÃO 3: CÁLCULOS PARA OS GRÁFICOS ---
-
-        # Gráfico 'Receita x Despesa'
-        transacoes_por_mes = Transacoes.objects.filter(
-            organization=org, pagamento__in=['pago', 'entrada']
-        ).annotate(mes=TruncMonth('data_transacao')).values('mes').annotate(
-            receita=Coalesce(Sum('valor', filter=Q(
-                tipo='entrada')), Decimal('0.00')),
-            despesa=Coalesce(
-                Sum('valor', filter=Q(tipo='saida')), Decimal('0.00'))
-        ).order_by('mes')
-        chart_receita_despesa = [{'mes': i['mes'].strftime('%b/%Y'), 'Receita': float(
-            i['receita']), 'Despesa': float(i['despesa'])} for i in transacoes_por_mes]
-
-        # Gráfico 'Brinquedos mais alugados'
-        ranking_brinquedos = Brinquedo.objects.filter(organization=org).annotate(
-            total_alugueis=Count('locacao')).filter(total_alugueis__gt=0).order_by('-total_alugueis')[:5]
-        chart_ranking_brinquedos = [
-            {'nome': b.nome, 'Aluguéis': b.total_alugueis} for b in ranking_brinquedos]
-
-        # Gráfico 'Despesas por categoria'
-        despesas_por_categoria = Transacoes.objects.filter(organization=org, tipo='saida', pagamento='pago').values(
-            'categoria').annotate(total=Sum('valor')).order_by('-total')
-        categoria_choices = dict(Transacoes.CATEGORIA_CHOICES)
-        chart_despesas_categoria = [{'name': categoria_choices.get(
-            i['categoria'], i['categoria']), 'value': float(i['total'])} for i in despesas_por_categoria]
-
-        # Gráfico 'Saldo acumulado'
-        transacoes_ordenadas = Transacoes.objects.filter(
-            organization=org, pagamento__in=['pago', 'entrada']).order_by('data_transacao')
-        saldo_atual, saldo_por_mes = Decimal('0.00'), {}
-        for transacao in transacoes_ordenadas:
-            saldo_atual += transacao.valor if transacao.tipo == 'entrada' else -transacao.valor
-            saldo_por_mes[transacao.data_transacao.strftime(
-                '%Y-%m')] = saldo_atual
-        chart_saldo_acumulado = [{'mes': date(int(mes_ano.split('-')[0]), int(mes_ano.split('-')[1]), 1).strftime(
-            '%b/%Y'), 'Saldo': float(saldo)} for mes_ano, saldo in sorted(saldo_por_mes.items())]
-
-        # Gráfico 'Receita por brinquedo'
-        receita_por_brinquedo_query = Brinquedo.objects.filter(organization=org).annotate(
-            total_receita=Coalesce(Sum('locacao__transacoes__valor', filter=Q(
-                locacao__transacoes__tipo='entrada', locacao__transacoes__pagamento__in=['pago', 'entrada'])), Decimal('0.00'))
-        ).filter(total_receita__gt=0).order_by('-total_receita')[:10]
-        chart_receita_brinquedo = [{'nome': b.nome, 'Receita': float(
-            b.total_receita)} for b in receita_por_brinquedo_query]
-
-        # --- SEÇÃO 4: MONTAR RESPOSTA FINAL ---
-        data = {
-            'stat_cards': {
-                'investimento_total': investimento_total,
-                'receita_acumulada': receita_acumulada,
-                'roi_global': roi_global,
-            },
-            'tabela_roi_brinquedo': roi_por_brinquedo,
-            'tabela_break_even': previsao_break_even,  # Adicionada!
-            'chart_receita_despesa': chart_receita_despesa,
-            'chart_ranking_brinquedos': chart_ranking_brinquedos,
-            'chart_despesas_categoria': chart_despesas_categoria,
-            'chart_saldo_acumulado': chart_saldo_acumulado,
-            'chart_receita_brinquedo': chart_receita_brinquedo,
-        }
-
-        return Response(data)
+        org = request.user.profile.organization
+        return Response(dashboard_em_cache(org, secoes, periodo))